@@ -0,0 +1 @@
+"""Benchmarks for the recommender, API and crawler; run with python -m bench"""
@@ -0,0 +1,155 @@
+"""
+Benchmark suite: python -m bench [--sizes 10000,100000,1000000] [--http] [--crawler]
+
+Each catalog size runs in its own process against a synthetic catalog and
+the results are written as JSON. With --baseline, timings are compared to
+an earlier results file and the exit status is non-zero on regressions.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src.catalog import load_catalog
+
+from .http_load import REPO_ROOT, run_http
+from .scenarios import run_crawl, run_size
+
+# Reported but not compared against a baseline: the HTTP scenario's fixed
+# run length and per-stage memory deltas, which can go either way
+UNCOMPARED = ("duration_s", "rss_delta_mb")
+
+# Above this size the O(n^2) neighbor table is skipped in favour of the ANN index
+AUTO_ANN_SIZE = 200_000
+
+def _in_subprocess(fn, *args):
+    # A fresh process per scenario keeps peak-memory figures separate
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _metrics(results, prefix=""):
+    """Flatten timing and memory figures into {path: value}"""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}/{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(_metrics(value, path))
+        elif key in UNCOMPARED:
+            continue
+        elif isinstance(value, (int, float)) and key.endswith(("_ms", "seconds", "_s", "peak_rss_mb")):
+            flat[path] = float(value)
+    return flat
+
+def compare(results, baseline, tolerance):
+    """Metrics that got worse than `baseline` by more than `tolerance` (a fraction)"""
+    current, previous = _metrics(results["runs"]), _metrics(baseline.get("runs", {}))
+    regressions = []
+    for path, value in sorted(current.items()):
+        old = previous.get(path)
+        if old is None or old <= 0:
+            continue
+        # Ignore sub-millisecond noise on very fast operations
+        floor = 1.0 if path.endswith("_ms") else 0.05
+        if value > old * (1 + tolerance) and value - old > floor:
+            regressions.append({"metric": path, "baseline": old, "current": value, "change": value / old - 1})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the recommender, API and crawler on synthetic catalogs")
+    parser.add_argument("--sizes", default="10000,100000", help="Comma-separated catalog sizes")
+    parser.add_argument("--index", choices=["auto", "exact", "ann"], default="auto",
+                        help=f"Similarity index (auto: ann above {AUTO_ANN_SIZE} movies)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per latency measurement")
+    parser.add_argument("--http", action="store_true", help="Also run the HTTP load scenario for each size")
+    parser.add_argument("--http-duration", type=float, default=15.0)
+    parser.add_argument("--http-concurrency", type=int, default=16)
+    parser.add_argument("--crawler", action="store_true", help="Also benchmark the crawler against a fake TMDb")
+    parser.add_argument("--crawl-count", type=int, default=2000)
+    parser.add_argument("--crawl-latency-ms", type=float, default=20.0)
+    parser.add_argument("--workdir", help="Where catalogs and models are generated (default: a temp dir)")
+    parser.add_argument("--out", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before flagging, as a fraction")
+    args = parser.parse_args(argv)
+
+    root = args.workdir or tempfile.mkdtemp(prefix="movie-bench-")
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "workdir": root,
+        },
+        "runs": {},
+    }
+
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        index = args.index
+        if index == "auto":
+            index = "ann" if size > AUTO_ANN_SIZE else "exact"
+        workdir = os.path.join(root, f"catalog-{size}")
+        print(f"[{size}] generating catalog and timing the recommender ({index} index)...", flush=True)
+        run = _in_subprocess(run_size, workdir, size, index, args.queries)
+        if args.http:
+            print(f"[{size}] HTTP load for {args.http_duration:.0f}s at concurrency {args.http_concurrency}...", flush=True)
+            catalog = load_catalog(os.path.join(workdir, "data", "tmdb_movies.jsonl"))
+            run["http"] = run_http(
+                workdir, catalog.titles, catalog.ids, args.http_duration, args.http_concurrency,
+                env={"RECOMMENDER_INDEX": index},
+            )
+        results["runs"][str(size)] = run
+        _print_run(run)
+
+    if args.crawler:
+        print(f"[crawler] fetching {args.crawl_count} movies at {args.crawl_latency_ms:.0f} ms per request...", flush=True)
+        results["runs"]["crawler"] = _in_subprocess(
+            run_crawl, os.path.join(root, "crawler"), args.crawl_count, args.crawl_latency_ms / 1000,
+        )
+        crawl = results["runs"]["crawler"]
+        print(f"  {crawl['movies']}/{crawl['target']} movies in {crawl['seconds']:.1f}s ({crawl['movies_per_second']:.0f}/s)")
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results["regressions"] = regressions
+        for r in regressions:
+            print(f"REGRESSION {r['metric']}: {r['baseline']:.2f} -> {r['current']:.2f} (+{r['change']:.0%})")
+        status = 1 if regressions else 0
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.out}")
+    return status
+
+def _print_run(run):
+    for name, stage in run["stages"].items():
+        if "seconds" in stage:
+            print(f"  {name:<22} {stage['seconds']:>9.2f} s   rss {stage['rss_delta_mb']:+.0f} MB")
+        else:
+            print(f"  {name:<22} p50 {stage['p50_ms']:>8.2f} ms   p95 {stage['p95_ms']:>8.2f} ms   p99 {stage['p99_ms']:>8.2f} ms")
+    print(f"  {'peak rss':<22} {run['peak_rss_mb']:>9.0f} MB")
+    for name, endpoint in run.get("http", {}).get("endpoints", {}).items():
+        if endpoint["count"]:
+            print(f"  http {name:<17} p50 {endpoint['p50_ms']:>8.2f} ms   p95 {endpoint['p95_ms']:>8.2f} ms   "
+                  f"p99 {endpoint['p99_ms']:>8.2f} ms   {endpoint['requests_per_second']:.0f} req/s")
+
+if __name__ == "__main__":
+    sys.exit(main())
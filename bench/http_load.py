@@ -0,0 +1,136 @@
+"""HTTP load scenario against src.main:app running under uvicorn"""
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+from .scenarios import latency_summary
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Share of requests per endpoint
+ENDPOINT_MIX = (("suggest", 0.70), ("recommend", 0.25), ("movie", 0.05))
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(workdir, port, env=None, timeout=600):
+    """
+    Run uvicorn on the catalog in `workdir`/data and wait until it answers.
+    The app resolves data/ and static/ against its working directory.
+    """
+    static = os.path.join(workdir, "static")
+    if not os.path.exists(static):
+        os.symlink(os.path.join(REPO_ROOT, "static"), static)
+    server_env = dict(os.environ, **(env or {}))
+    server_env["PYTHONPATH"] = REPO_ROOT + os.pathsep + server_env.get("PYTHONPATH", "")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=workdir, env=server_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/suggest?q=a")
+            if conn.getresponse().status == 200:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("uvicorn did not become ready in time")
+
+def _paths(endpoint, titles, ids, rng):
+    if endpoint == "suggest":
+        title = rng.choice(titles)
+        return "/suggest?" + urllib.parse.urlencode({"q": title[:rng.randint(1, 8)]})
+    if endpoint == "recommend":
+        # Skewed towards a few popular titles, like real traffic
+        title = titles[min(int(rng.paretovariate(1.2)) - 1, len(titles) - 1)]
+        return "/recommend/content?" + urllib.parse.urlencode({"title": title})
+    return f"/movie/{rng.choice(ids)}"
+
+def run_load(port, titles, ids, duration=15.0, concurrency=16, seed=0):
+    """
+    Drive the running server from `concurrency` keep-alive connections for
+    `duration` seconds and return latency percentiles per endpoint
+    """
+    samples = {endpoint: [] for endpoint, _ in ENDPOINT_MIX}
+    statuses = {endpoint: {} for endpoint, _ in ENDPOINT_MIX}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    endpoints = [endpoint for endpoint, _ in ENDPOINT_MIX]
+    weights = [weight for _, weight in ENDPOINT_MIX]
+
+    def client(worker):
+        rng = random.Random(seed * 1000 + worker)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        local = []
+        while time.monotonic() < deadline:
+            endpoint = rng.choices(endpoints, weights)[0]
+            path = _paths(endpoint, titles, ids, rng)
+            start = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except OSError:
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                status = "error"
+            local.append((endpoint, status, time.perf_counter() - start))
+        conn.close()
+        with lock:
+            for endpoint, status, seconds in local:
+                statuses[endpoint][status] = statuses[endpoint].get(status, 0) + 1
+                if status == 200:
+                    samples[endpoint].append(seconds)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {"duration_s": elapsed, "concurrency": concurrency, "endpoints": {}}
+    for endpoint in endpoints:
+        total = sum(statuses[endpoint].values())
+        results["endpoints"][endpoint] = {
+            **latency_summary(samples[endpoint]),
+            "requests_per_second": total / elapsed,
+            "statuses": {str(status): count for status, count in statuses[endpoint].items()},
+        }
+    all_ok = [s for endpoint in endpoints for s in samples[endpoint]]
+    results["overall"] = latency_summary(all_ok)
+    return results
+
+def run_http(workdir, titles, ids, duration=15.0, concurrency=16, env=None):
+    """Start the server on `workdir`, run the load scenario and stop it again"""
+    port = _free_port()
+    started = time.perf_counter()
+    process = start_server(workdir, port, env)
+    startup = time.perf_counter() - started
+    try:
+        results = run_load(port, titles, ids, duration, concurrency)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.request("GET", "/cache/stats")
+        results["server_stats"] = json.loads(conn.getresponse().read())
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    results["startup_s"] = startup
+    return results
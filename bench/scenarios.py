@@ -0,0 +1,137 @@
+"""In-process benchmark scenarios: model build, title resolution, recommendations, suggest and crawl"""
+import contextlib
+import io
+import logging
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+
+from src.catalog import load_catalog
+from src.recommend_enhanced import load_engine
+from src.storage import CatalogLog
+
+from .synthetic import FakeTMDbClient, SyntheticCatalog, write_catalog
+
+def peak_rss_mb():
+    """High-water mark of this process's resident memory over its whole lifetime"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def rss_mb():
+    """Current resident memory of this process, or its peak where that isn't available"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        return peak_rss_mb()
+
+def latency_summary(seconds):
+    """p50/p95/p99/mean in milliseconds of a list of durations"""
+    ms = np.asarray(seconds) * 1000
+    if not len(ms):
+        return {"count": 0}
+    return {
+        "count": int(len(ms)),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+def _timed(stages, name, fn, *args, **kwargs):
+    # Memory is reported as the change over the stage: the lifetime peak
+    # only ever rises, so it says nothing about the stage itself
+    rss = rss_mb()
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    stages[name] = {"seconds": time.perf_counter() - start, "rss_delta_mb": rss_mb() - rss}
+    return result
+
+def _sample_each(fn, inputs):
+    timings = []
+    for value in inputs:
+        start = time.perf_counter()
+        fn(value)
+        timings.append(time.perf_counter() - start)
+    return latency_summary(timings)
+
+def _typo(title, rng):
+    if len(title) < 4:
+        return title
+    i = int(rng.integers(1, len(title) - 1))
+    return title[:i] + title[i + 1:]
+
+def run_size(workdir, size, index="exact", queries=200, seed=0):
+    """
+    Generate a `size`-movie catalog under `workdir`/data and time each
+    stage of the recommender on it. Meant to run in a fresh process so the
+    overall peak memory figure belongs to this size alone.
+    """
+    catalog_path = os.path.join(workdir, "data", "tmdb_movies.jsonl")
+    model_dir = os.path.join(workdir, "data", "model")
+    os.makedirs(os.path.dirname(catalog_path), exist_ok=True)
+    stages = {}
+    rng = np.random.default_rng(seed)
+
+    _timed(stages, "generate", write_catalog, catalog_path, size, seed)
+    # The first load parses JSON Lines and writes the Parquet export; the
+    # second is what a server start costs
+    _timed(stages, "catalog_first_load", load_catalog, catalog_path)
+    catalog = _timed(stages, "catalog_load", load_catalog, catalog_path)
+    _timed(stages, "model_build", load_engine, catalog_path, model_dir, catalog, index)
+    engine = _timed(stages, "model_load", load_engine, catalog_path, model_dir, catalog, index)
+    _timed(stages, "suggest_index_build", lambda: catalog.suggest_index)
+
+    titles = [catalog.titles[i] for i in rng.choice(len(catalog), queries)]
+    stages["resolve_exact"] = _sample_each(engine.match_title, titles)
+    stages["resolve_normalized"] = _sample_each(engine.match_title, [f"  {t.lower()} " for t in titles])
+    stages["resolve_fuzzy"] = _sample_each(engine.match_title, [_typo(t, rng) for t in titles])
+    stages["recommend"] = _sample_each(engine.recommend, titles)
+
+    batches = [titles[i:i + 20] for i in range(0, len(titles), 20)]
+    stages["recommend_batch_20"] = _sample_each(lambda batch: engine.recommend_batch(batch, 6, True), batches)
+
+    prefixes = [t[:int(rng.integers(1, 9))] for t in titles]
+    infixes = [t[len(t) // 3:len(t) // 3 + 5] for t in titles]
+    stages["suggest_prefix"] = _sample_each(catalog.suggest, prefixes)
+    stages["suggest_infix"] = _sample_each(catalog.suggest, infixes)
+
+    return {"movies": size, "index": index, "peak_rss_mb": peak_rss_mb(), "stages": stages}
+
+def run_crawl(workdir, count, latency=0.0, seed=0):
+    """Crawl `count` movies from a fake TMDb with `latency` seconds per request"""
+    from src.fetch_tmdb_data import main as crawl_catalog
+
+    os.makedirs(workdir, exist_ok=True)
+    previous = os.getcwd()
+    # The fetcher keeps its sync state relative to the working directory
+    os.chdir(workdir)
+    try:
+        storage = CatalogLog(os.path.join("data", "crawl.jsonl"))
+        if os.path.exists(storage.path):
+            os.remove(storage.path)
+        client = FakeTMDbClient(SyntheticCatalog(max(count * 4, 1000), seed), latency)
+        start = time.perf_counter()
+        # Silence the progress bars and per-batch progress logging
+        logging.disable(logging.INFO)
+        try:
+            with contextlib.redirect_stderr(io.StringIO()):
+                crawl_catalog(client, target_count=count, storage=storage, respect_target=True)
+        finally:
+            logging.disable(logging.NOTSET)
+        seconds = time.perf_counter() - start
+        crawled = len(storage.read())
+    finally:
+        os.chdir(previous)
+    return {
+        "target": count,
+        "movies": crawled,
+        "request_latency_ms": latency * 1000,
+        "seconds": seconds,
+        "movies_per_second": crawled / seconds if seconds else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
@@ -0,0 +1,175 @@
+"""
+Synthetic TMDb-shaped catalogs, so the recommender, API and crawler can be
+measured without an API key. Records have the schema written by
+src.fetch_tmdb_data.extract_metadata.
+"""
+import time
+import zlib
+
+import numpy as np
+
+from src.storage import CatalogLog
+
+GENRES = [
+    (28, "Action"), (12, "Adventure"), (16, "Animation"), (35, "Comedy"), (80, "Crime"),
+    (99, "Documentary"), (18, "Drama"), (10751, "Family"), (14, "Fantasy"), (36, "History"),
+    (27, "Horror"), (10402, "Music"), (9648, "Mystery"), (10749, "Romance"), (878, "Science Fiction"),
+    (10770, "TV Movie"), (53, "Thriller"), (10752, "War"), (37, "Western"),
+]
+
+_SYLLABLES = [
+    "ka", "lo", "ri", "ven", "mar", "tos", "el", "an", "dor", "shi", "qua", "bel", "mi", "ro", "tan",
+    "gre", "vi", "sol", "nor", "ath", "ul", "zen", "pa", "cor", "fel", "ix", "om", "ra", "ste", "wyn",
+]
+
+# Share of titles that continue an earlier title as a numbered sequel
+SEQUEL_SHARE = 0.1
+
+def _words(count, rng):
+    """`count` distinct pseudo-words of two to four syllables"""
+    words = set()
+    while len(words) < count:
+        parts = rng.choice(_SYLLABLES, rng.integers(2, 5))
+        words.add("".join(parts))
+    # Sorted first so the result doesn't depend on set order, then shuffled
+    # so word frequency isn't tied to alphabetical order
+    words = np.array(sorted(words), dtype=object)
+    return words[rng.permutation(len(words))]
+
+def _zipf(size, exponent=1.1):
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    return weights / weights.sum()
+
+class SyntheticCatalog:
+    """
+    Deterministic catalog of `size` movies. Word, genre and people
+    frequencies follow Zipf-like distributions so vocabularies, posting
+    lists and neighbor sets look like the real catalog's rather than
+    uniform noise.
+    """
+
+    def __init__(self, size, seed=0):
+        self.size = size
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self.vocabulary = _words(20000, rng)
+        self.vocabulary_p = _zipf(len(self.vocabulary))
+        self.title_words = np.array([word.title() for word in self.vocabulary[:4000]], dtype=object)
+        self.title_p = _zipf(len(self.title_words), 0.8)
+        names = np.array([word.title() for word in _words(3000, rng)], dtype=object)
+        self.people = np.array(
+            [f"{first} {last}" for first, last in zip(rng.choice(names, size // 4 + 1000), rng.choice(names, size // 4 + 1000))],
+            dtype=object,
+        )
+        self.people_p = _zipf(len(self.people), 0.9)
+        self.genre_p = _zipf(len(GENRES), 0.7)
+
+    def movies(self, start=0, stop=None):
+        """Records for movie ids start+1 .. stop, generated in one vectorized batch"""
+        stop = self.size if stop is None else stop
+        count = stop - start
+        if count <= 0:
+            return []
+        rng = np.random.default_rng([self.seed, start])
+
+        overview_lengths = rng.integers(20, 61, count)
+        overview_words = np.split(
+            rng.choice(len(self.vocabulary), overview_lengths.sum(), p=self.vocabulary_p),
+            np.cumsum(overview_lengths)[:-1],
+        )
+        title_lengths = rng.integers(1, 5, count)
+        title_words = np.split(
+            rng.choice(len(self.title_words), title_lengths.sum(), p=self.title_p),
+            np.cumsum(title_lengths)[:-1],
+        )
+        genre_counts = rng.integers(1, 4, count)
+        actors = rng.choice(len(self.people), (count, 5), p=self.people_p)
+        directors = rng.choice(len(self.people), count, p=self.people_p)
+        sequels = rng.random(count) < SEQUEL_SHARE
+        years = rng.integers(1920, 2026, count)
+        months = rng.integers(1, 13, count)
+        days = rng.integers(1, 29, count)
+        votes = np.round(np.clip(rng.normal(6.2, 1.4, count), 0, 10), 1)
+
+        movies = []
+        for i in range(count):
+            if sequels[i] and movies:
+                # Continue a recent title so franchises cluster
+                base = movies[-1 - int(rng.integers(0, min(len(movies), 50)))]["title"]
+                title = f"{base.rsplit(' ', 1)[0] if base[-1].isdigit() else base} {int(rng.integers(2, 6))}"
+            else:
+                title = " ".join(self.title_words[title_words[i]])
+            genres = rng.choice(len(GENRES), genre_counts[i], replace=False, p=self.genre_p)
+            movie_id = start + i + 1
+            movies.append({
+                "id": movie_id,
+                "title": title,
+                "overview": " ".join(self.vocabulary[overview_words[i]]).capitalize() + ".",
+                "genres": [GENRES[g][1] for g in genres],
+                "actors": list(dict.fromkeys(self.people[actors[i]])),
+                "directors": [self.people[directors[i]]],
+                "release_date": f"{years[i]}-{months[i]:02d}-{days[i]:02d}",
+                "poster_url": f"https://image.tmdb.org/t/p/w500/synthetic{movie_id}.jpg",
+                "vote_average": float(votes[i]),
+            })
+        return movies
+
+def write_catalog(path, size, seed=0, chunk=10000):
+    """Write a synthetic catalog of `size` movies to JSON Lines storage at `path`"""
+    catalog = SyntheticCatalog(size, seed)
+    storage = CatalogLog(path)
+    storage.compact([])
+    for start in range(0, size, chunk):
+        storage.append(catalog.movies(start, min(start + chunk, size)))
+    return catalog
+
+class FakeTMDbClient:
+    """
+    Stand-in for TMDbClient serving a SyntheticCatalog through the TMDb
+    endpoints the crawler uses. `latency` seconds are added per request to
+    imitate the network.
+    """
+
+    page_size = 20
+
+    def __init__(self, catalog, latency=0.0):
+        self.catalog = catalog
+        self.latency = latency
+
+    def get(self, path, **params):
+        if self.latency:
+            time.sleep(self.latency)
+        if path == "/genre/movie/list":
+            return {"genres": [{"id": genre_id, "name": name} for genre_id, name in GENRES]}
+        if path == "/movie/changes":
+            return {"results": [], "page": 1, "total_pages": 1}
+        if path.startswith("/movie/") and path[len("/movie/"):].isdigit():
+            return self._details(int(path[len("/movie/"):]))
+        return self._page(path, params)
+
+    def _details(self, movie_id):
+        movie = self.catalog.movies(movie_id - 1, movie_id)[0]
+        names = {name: genre_id for genre_id, name in GENRES}
+        return {
+            "id": movie["id"],
+            "title": movie["title"],
+            "overview": movie["overview"],
+            "genres": [{"id": names[name], "name": name} for name in movie["genres"]],
+            "credits": {
+                "cast": [{"name": name} for name in movie["actors"]],
+                "crew": [{"name": name, "job": "Director"} for name in movie["directors"]],
+            },
+            "poster_path": "/" + movie["poster_url"].rsplit("/", 1)[1],
+            "release_date": movie["release_date"],
+            "vote_average": movie["vote_average"],
+        }
+
+    def _page(self, path, params):
+        # Each list endpoint walks the catalog from its own offset, so
+        # sources overlap the way TMDb's lists do
+        page = int(params.get("page", 1))
+        source = path + repr(sorted((k, v) for k, v in params.items() if k != "page"))
+        offset = zlib.crc32(source.encode()) % self.catalog.size
+        first = offset + (page - 1) * self.page_size
+        ids = [(first + i) % self.catalog.size + 1 for i in range(self.page_size)]
+        return {"page": page, "results": [{"id": movie_id, "title": f"#{movie_id}"} for movie_id in ids]}
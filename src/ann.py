@@ -0,0 +1,181 @@
+import argparse
+import os
+import time
+
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+
+from .model_store import load_csr, save_array
+from .neighbors import BLOCK_CELLS
+from .scoring import sparse_top_k
+
+# Dimensions of the dense LSA embeddings
+ANN_COMPONENTS = 128
+
+# Inverted lists scanned per query; the recall-vs-latency knob
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+
+# Candidates rescored with exact TF-IDF cosine per requested neighbor
+ANN_RERANK = 4
+
+# Lloyd iterations and training points per list for the coarse quantizer
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+
+def _nearest_centroids(vectors, centroids):
+    """Index of the most similar centroid for every vector, in blocks of at most BLOCK_CELLS cells"""
+    block = max(1, BLOCK_CELLS // max(len(centroids), 1))
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block):
+        sims = vectors[start:start + block] @ centroids.T
+        assignment[start:start + block] = sims.argmax(axis=1)
+    return assignment
+
+def _spherical_kmeans(vectors, nlist, iterations=KMEANS_ITERATIONS, seed=0):
+    """Unit-length centroids for cosine k-means on a sample of `vectors`"""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * KMEANS_SAMPLE_PER_LIST)
+    sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _nearest_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = ~sums.any(axis=1)
+        # Reseed empty lists with random training points
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = normalize(sums).astype(np.float32)
+    return centroids
+
+class IVFIndex:
+    """
+    Inverted-file index over unit-length float32 vectors.
+    Vectors are grouped by their nearest k-means centroid; a query only
+    scores the vectors in its `nprobe` most similar lists. Lists are stored
+    as one row order array plus offsets, like the rows of a CSR matrix.
+    """
+
+    def __init__(self, vectors, centroids, order, offsets):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, vectors, nlist=None, seed=0):
+        if nlist is None:
+            nlist = int(np.sqrt(len(vectors)))
+        nlist = max(1, min(nlist, len(vectors)))
+        centroids = _spherical_kmeans(vectors, nlist, seed=seed)
+        assignment = _nearest_centroids(vectors, centroids)
+        order = np.argsort(assignment, kind="stable").astype(np.int32)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=nlist), out=offsets[1:])
+        return cls(vectors, centroids, order, offsets)
+
+    def candidates(self, query, nprobe=ANN_NPROBE):
+        """Rows in the `nprobe` lists closest to `query`"""
+        nprobe = min(nprobe, len(self.centroids))
+        sims = self.centroids @ query
+        lists = np.argpartition(-sims, nprobe - 1)[:nprobe]
+        return np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in lists])
+
+    def search(self, query, count, nprobe=ANN_NPROBE):
+        """(rows, scores) of the approximately `count` most similar vectors, best first"""
+        rows = self.candidates(query, nprobe)
+        scores = self.vectors[rows] @ query
+        if len(rows) > count:
+            top = np.argpartition(-scores, count - 1)[:count]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return rows[order], scores[order]
+
+def build_ann_index(model_path, n_components=ANN_COMPONENTS, nlist=None):
+    """
+    Reduce the artifact's TF-IDF matrix to dense unit-length LSA vectors
+    with TruncatedSVD, build an IVF index over them and store both next to
+    the model artifact
+    """
+    matrix = load_csr(model_path)
+    n_components = max(1, min(n_components, matrix.shape[1] - 1, matrix.shape[0] - 1))
+    svd = TruncatedSVD(n_components=n_components, algorithm="randomized", random_state=0)
+    vectors = normalize(svd.fit_transform(matrix)).astype(np.float32)
+    index = IVFIndex.build(vectors, nlist)
+
+    save_array(os.path.join(model_path, "ann_vectors.npy"), vectors)
+    save_array(os.path.join(model_path, "ann_centroids.npy"), index.centroids)
+    save_array(os.path.join(model_path, "ann_order.npy"), index.order)
+    save_array(os.path.join(model_path, "ann_offsets.npy"), index.offsets)
+    return index
+
+def load_ann_index(model_path):
+    """
+    Memory-map the IVFIndex of an artifact, or return None if it hasn't
+    been built
+    """
+    try:
+        arrays = {
+            name: np.load(os.path.join(model_path, f"ann_{name}.npy"), mmap_mode="r")
+            for name in ("vectors", "centroids", "order", "offsets")
+        }
+    except (OSError, ValueError):
+        return None
+    if len(arrays["order"]) != len(arrays["vectors"]) or arrays["offsets"][-1] != len(arrays["order"]):
+        return None
+    # The centroids are scanned on every query, so keep them in memory
+    index = IVFIndex(arrays["vectors"], np.array(arrays["centroids"]), arrays["order"], arrays["offsets"])
+    return index
+
+def _exact_top(engine, row, count):
+    indices, _ = sparse_top_k(engine.tfidf_matrix[row], engine.postings, count)
+    return indices[0]
+
+def benchmark(engine, queries=200, count=10, nprobes=(1, 2, 4, 8, 16, 32, 64), seed=0):
+    """
+    Recall@count of the ANN engine against the exact sparse scan, and the
+    mean/p95 latency of both, for a range of nprobe settings
+    """
+    matrix = engine.tfidf_matrix
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(matrix.shape[0], min(queries, matrix.shape[0]), replace=False)
+
+    # Build the posting lists outside the timed loop
+    engine.postings
+    exact, timings = {}, []
+    for row in rows:
+        start = time.perf_counter()
+        exact[row] = set(_exact_top(engine, row, count + 1).tolist())
+        timings.append(time.perf_counter() - start)
+    results = [{"nprobe": "exact", "recall": 1.0, **_latency(timings)}]
+
+    for nprobe in nprobes:
+        engine.nprobe = nprobe
+        hits, timings = 0, []
+        for row in rows:
+            start = time.perf_counter()
+            found, _ = engine.similar(row, count + 1)
+            timings.append(time.perf_counter() - start)
+            hits += len(exact[row] & set(np.asarray(found).tolist()))
+        results.append({"nprobe": nprobe, "recall": hits / (len(rows) * (count + 1)), **_latency(timings)})
+    return results
+
+def _latency(timings):
+    timings = np.asarray(timings) * 1000
+    return {"mean_ms": float(timings.mean()), "p95_ms": float(np.percentile(timings, 95))}
+
+if __name__ == "__main__":
+    # Recall benchmark: python -m src.ann [--queries N] [--k K]
+    from .recommend_enhanced import load_engine
+
+    parser = argparse.ArgumentParser(description="Recall and latency of the ANN engine against the exact scan")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    engine = load_engine(index="ann")
+    print(f"{len(engine.movie_titles)} movies, {len(engine.ann.centroids)} lists, "
+          f"{engine.ann.vectors.shape[1]} dimensions")
+    print(f"{'nprobe':>8} {'recall@' + str(args.k):>10} {'mean ms':>9} {'p95 ms':>9}")
+    for result in benchmark(engine, args.queries, args.k):
+        print(f"{result['nprobe']:>8} {result['recall']:>10.3f} {result['mean_ms']:>9.2f} {result['p95_ms']:>9.2f}")
@@ -0,0 +1,143 @@
+import logging
+import os
+import threading
+
+import numpy as np
+
+from .facets import FacetIndex
+from .metrics import span, timed
+from .movie_table import MovieTable
+from .storage import CATALOG_FILE, read_catalog_table
+from .suggest_index import SuggestIndex
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = CATALOG_FILE
+
+# Columns needed for id lookups and suggestions; the rest are only read
+# from the columnar export when a detail lookup first needs them
+INDEX_COLUMNS = ["id", "title", "vote_average"]
+
+class CatalogStore:
+    """
+    The movie catalog, loaded once per process.
+    Backed by one compact MovieTable that starts with the id, title and
+    rating columns and gets the rest from the columnar export when details
+    or the recommender first need them. Its ids and titles are shared with
+    the engine and the title indexes rather than copied into lists; ids are
+    looked up through a sorted array, and titles feed a ranked suggestion
+    index.
+    """
+
+    def __init__(self, movies, path=CATALOG_PATH, stamp=None, source_hash=None):
+        self.path = path
+        # (mtime, size) of the file this was loaded from
+        self.stamp = stamp
+        # Content hash of the catalog file, shared with the model artifact
+        self.source_hash = source_hash
+        self._suggest_index = None
+        self._facets = None
+        self._index = movies
+        self._movies = None
+        self._lock = threading.Lock()
+        self.vote_average = np.nan_to_num(movies.column('vote_average').astype(np.float64))
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def ids(self):
+        return self._index.ids
+
+    @property
+    def titles(self):
+        return self._index.titles
+
+    def columns(self, names):
+        """Arrow table with just the given columns, read from the columnar export"""
+        table, source_hash = read_catalog_table(names, self.path)
+        if source_hash != self.source_hash:
+            logger.warning(f"{self.path} changed since it was loaded; reload the catalog")
+        return table
+
+    @property
+    def movies(self):
+        """MovieTable of every column, read on first use (details, the recommender)"""
+        if self._movies is None:
+            with self._lock:
+                if self._movies is None:
+                    with span("catalog_movies_load"):
+                        table, source_hash = read_catalog_table(None, self.path)
+                        if source_hash == self.source_hash:
+                            self._index.extend(table)
+                            movies = self._index
+                        else:
+                            # The file moved on since the index columns were
+                            # loaded, so keep its rows apart from theirs
+                            logger.warning(f"{self.path} changed since it was loaded; reload the catalog")
+                            movies = MovieTable(table)
+                    self._movies = movies
+        return self._movies
+
+    @timed("catalog_get")
+    def get(self, movie_id):
+        """Return a lazy view of the movie with the given TMDb id, or None"""
+        movies = self.movies
+        row = movies.row(movie_id)
+        if row is None:
+            return None
+        return movies.movie(row)
+
+    @property
+    def suggest_index(self):
+        """Autocomplete index, built on first use"""
+        if self._suggest_index is None:
+            with span("suggest_index_build"):
+                self._suggest_index = SuggestIndex.from_catalog(self)
+        return self._suggest_index
+
+    @property
+    def facets(self):
+        """Genre/year/rating filter index, built on first use"""
+        if self._facets is None:
+            with span("facet_index_build"):
+                self._facets = FacetIndex.from_catalog(self)
+        return self._facets
+
+    @timed("suggest")
+    def suggest(self, q, limit=10, **filters):
+        """
+        Titles matching `q`, ranked by match quality then rating, among the
+        movies passing the FacetIndex.mask `filters`
+        """
+        allowed = self.facets.mask(**filters) if filters else None
+        return self.suggest_index.suggest(q, limit, allowed)
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+@timed("catalog_load")
+def load_catalog(path=CATALOG_PATH):
+    """Load the id/title/rating columns of the catalog into a CatalogStore"""
+    stamp = _file_stamp(path) if os.path.exists(path) else None
+    table, source_hash = read_catalog_table(INDEX_COLUMNS, path)
+    if stamp is None:
+        # The file was just migrated from the legacy JSON format
+        stamp = _file_stamp(path)
+    return CatalogStore(MovieTable(table), path, stamp, source_hash)
+
+# Shared catalog, loaded once per process (see get_catalog)
+_catalog = None
+
+def get_catalog():
+    """Return the process-wide catalog, loading it on first use"""
+    global _catalog
+    if _catalog is None:
+        _catalog = load_catalog()
+    return _catalog
+
+def set_catalog(catalog):
+    """Replace the process-wide catalog, e.g. with a reloaded one (see src/reload.py)"""
+    global _catalog
+    _catalog = catalog
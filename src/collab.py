@@ -0,0 +1,184 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+from scipy import sparse
+
+from .metrics import timed
+from .scoring import top_k
+
+COLLAB_DIR = "data/collab"
+
+class CollabModel:
+    """
+    Biased matrix factorization trained offline (see
+    src/generate_collab_recs.py). The predicted rating of every item for
+    a user is global_mean + user_bias + item_bias + item_factors @ user
+    vector, so ranking a user's unseen items is one matrix-vector product
+    and a partial sort.
+    """
+
+    def __init__(self, user_ids, item_ids, titles, user_factors, item_factors, user_bias, item_bias,
+                 global_mean, rating_scale, seen, tmdb_ids=None, version=None):
+        self.user_ids = list(user_ids)
+        self.item_ids = np.asarray(item_ids)
+        # TMDb id of each item from MovieLens links.csv, -1 where unknown
+        self.tmdb_ids = np.full(len(self.item_ids), -1, dtype=np.int64) if tmdb_ids is None else np.asarray(tmdb_ids)
+        self.titles = list(titles)
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.user_bias = user_bias
+        self.item_bias = item_bias
+        self.global_mean = global_mean
+        self.rating_scale = tuple(rating_scale)
+        # users x items CSR of what each user has already rated
+        self.seen = seen
+        self.version = version
+        self.user_index = {str(uid): row for row, uid in enumerate(self.user_ids)}
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def user_row(self, user_id):
+        """Row of `user_id` in the factor matrices, or None for an unknown user"""
+        return self.user_index.get(str(user_id))
+
+    def seen_items(self, row):
+        """Items the user at `row` has rated"""
+        return self.seen.indices[self.seen.indptr[row]:self.seen.indptr[row + 1]]
+
+    def baseline(self, row):
+        """Predicted rating of an item the model knows nothing about"""
+        return float(self.global_mean + self.user_bias[row])
+
+    def predict_items(self, row, items):
+        """Predicted ratings of the user at `row` for the given items, before clipping"""
+        items = np.asarray(items, dtype=np.intp)
+        return self.item_factors[items] @ self.user_factors[row] + self.item_bias[items] + self.baseline(row)
+
+    def top_items(self, row, count):
+        """(items, predicted ratings) of the `count` best unseen items for the user at `row`"""
+        scores = self._predict([row])[0]
+        seen = self.seen_items(row)
+        scores[seen] = -np.inf
+        top = top_k(scores, min(count, len(scores) - len(seen)))
+        return top, scores[top]
+
+    def _predict(self, rows):
+        # (len(rows), items) predicted ratings, before clipping
+        scores = self.user_factors[rows] @ self.item_factors.T
+        scores += self.item_bias
+        scores += (self.global_mean + self.user_bias[rows])[:, None]
+        return scores
+
+    @timed("collab")
+    def recommend(self, user_id, top_n=10):
+        """Highest predicted unseen items for `user_id`, or None for an unknown user"""
+        row = self.user_row(user_id)
+        if row is None:
+            return None
+        items, scores = self.top_items(row, top_n)
+        low, high = self.rating_scale
+        return [
+            {"movie_id": int(self.item_ids[i]), "title": self.titles[i],
+             "predicted_rating": round(float(np.clip(score, low, high)), 3)}
+            for i, score in zip(items, scores)
+        ]
+
+def save_collab_model(version, user_ids, item_ids, titles, user_factors, item_factors, user_bias, item_bias,
+                      global_mean, rating_scale, seen, tmdb_ids=None, collab_dir=COLLAB_DIR):
+    """
+    Write the factor matrices, biases, id maps (including the MovieLens ->
+    TMDb mapping) and rated-items matrix into a directory named after
+    `version`, renamed into place once complete
+    """
+    final_dir = os.path.join(collab_dir, version[:16])
+    tmp_dir = os.path.join(collab_dir, f".{version[:16]}.tmp{os.getpid()}")
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    np.save(os.path.join(tmp_dir, "user_factors.npy"), np.asarray(user_factors, dtype=np.float32))
+    np.save(os.path.join(tmp_dir, "item_factors.npy"), np.asarray(item_factors, dtype=np.float32))
+    np.save(os.path.join(tmp_dir, "user_bias.npy"), np.asarray(user_bias, dtype=np.float32))
+    np.save(os.path.join(tmp_dir, "item_bias.npy"), np.asarray(item_bias, dtype=np.float32))
+    np.save(os.path.join(tmp_dir, "item_ids.npy"), np.asarray(item_ids, dtype=np.int64))
+    if tmdb_ids is None:
+        tmdb_ids = np.full(len(item_ids), -1)
+    np.save(os.path.join(tmp_dir, "item_tmdb_ids.npy"), np.asarray(tmdb_ids, dtype=np.int64))
+    seen = sparse.csr_matrix(seen)
+    np.save(os.path.join(tmp_dir, "seen_indices.npy"), seen.indices.astype(np.int32))
+    np.save(os.path.join(tmp_dir, "seen_indptr.npy"), seen.indptr.astype(np.int64))
+    with open(os.path.join(tmp_dir, "ids.json"), "w", encoding="utf-8") as f:
+        json.dump({"user_ids": [str(uid) for uid in user_ids], "titles": list(titles)}, f, ensure_ascii=False)
+
+    manifest = {
+        "version": version,
+        "users": len(user_ids),
+        "items": len(item_ids),
+        "factors": int(np.shape(user_factors)[1]),
+        "global_mean": float(global_mean),
+        "rating_scale": list(rating_scale),
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.rename(tmp_dir, final_dir)
+    # Keep only the model just written
+    for name in os.listdir(collab_dir):
+        if name != version[:16] and not name.startswith("."):
+            shutil.rmtree(os.path.join(collab_dir, name), ignore_errors=True)
+    return final_dir
+
+@timed("collab_load")
+def load_collab_model(collab_dir=COLLAB_DIR):
+    """Memory-map the most recently trained model, or return None if there is none"""
+    if not os.path.isdir(collab_dir):
+        return None
+    candidates = [os.path.join(collab_dir, name) for name in os.listdir(collab_dir) if not name.startswith(".")]
+    for path in sorted(candidates, key=os.path.getmtime, reverse=True):
+        try:
+            with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            with open(os.path.join(path, "ids.json"), "r", encoding="utf-8") as f:
+                ids = json.load(f)
+            arrays = {
+                name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                for name in ("user_factors", "item_factors", "user_bias", "item_bias", "item_ids",
+                             "item_tmdb_ids", "seen_indices", "seen_indptr")
+            }
+        except (OSError, ValueError, KeyError):
+            continue
+        n_users, n_items = manifest["users"], manifest["items"]
+        seen = sparse.csr_matrix(
+            (np.ones(len(arrays["seen_indices"]), dtype=np.int8), arrays["seen_indices"], arrays["seen_indptr"]),
+            shape=(n_users, n_items),
+        )
+        return CollabModel(
+            ids["user_ids"], arrays["item_ids"], ids["titles"], arrays["user_factors"], arrays["item_factors"],
+            arrays["user_bias"], arrays["item_bias"], manifest["global_mean"], manifest["rating_scale"], seen,
+            tmdb_ids=arrays["item_tmdb_ids"], version=manifest["version"],
+        )
+    return None
+
+# Shared model, loaded once per process (see get_collab_model). Having no
+# model is remembered too, so requests don't rescan the directory; a model
+# trained later arrives through the reloader's set_collab_model.
+_collab = None
+_collab_loaded = False
+
+def get_collab_model():
+    """Return the process-wide collaborative model, or None if none has been trained"""
+    global _collab, _collab_loaded
+    if not _collab_loaded:
+        _collab = load_collab_model()
+        _collab_loaded = True
+    return _collab
+
+def set_collab_model(model):
+    """Replace the process-wide collaborative model (see src/reload.py)"""
+    global _collab, _collab_loaded
+    _collab = model
+    _collab_loaded = True
@@ -0,0 +1,79 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+FACET_COLUMNS = ["genres", "release_date", "vote_average"]
+
+def _year(release_date):
+    # "YYYY-MM-DD" -> YYYY, 0 when unknown
+    if release_date and release_date[:4].isdigit():
+        return int(release_date[:4])
+    return 0
+
+class FacetIndex:
+    """
+    Precomputed facet indexes over catalog rows: a row bitmap per genre,
+    and rows sorted by release year and by rating so a range is two
+    binary searches. mask() combines the filters of a query into one
+    boolean row mask, which scoring applies before top-K selection so a
+    filtered query still fills its K results.
+    """
+
+    def __init__(self, table):
+        self.size = table.num_rows
+
+        # Genre (lowercased) -> boolean row bitmap
+        lists = table.column("genres").combine_chunks()
+        parents = pc.list_parent_indices(lists).to_numpy()
+        flat = pc.list_flatten(lists)
+        if pa.types.is_dictionary(flat.type):
+            # The Parquet export stores names dictionary-encoded
+            flat = flat.dictionary_decode()
+        names = pc.utf8_lower(flat).dictionary_encode()
+        codes = names.indices.to_numpy(zero_copy_only=False)
+        self.genres = {}
+        for code, name in enumerate(names.dictionary.to_pylist()):
+            bitmap = np.zeros(self.size, dtype=bool)
+            bitmap[parents[codes == code]] = True
+            self.genres[name] = bitmap
+
+        years = np.array([_year(date) for date in table.column("release_date").to_pylist()], dtype=np.int32)
+        self.year_order = np.argsort(years, kind="stable")
+        self.years = years[self.year_order]
+
+        ratings = table.column("vote_average").fill_null(0).to_numpy()
+        self.rating_order = np.argsort(ratings, kind="stable")
+        self.ratings = ratings[self.rating_order]
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        return cls(catalog.columns(FACET_COLUMNS))
+
+    def _range(self, order, values, low, high):
+        lo = 0 if low is None else np.searchsorted(values, low, side="left")
+        hi = len(values) if high is None else np.searchsorted(values, high, side="right")
+        mask = np.zeros(self.size, dtype=bool)
+        mask[order[lo:hi]] = True
+        return mask
+
+    def mask(self, genres=None, year_min=None, year_max=None, min_rating=None):
+        """
+        Boolean mask of the rows that have every genre in `genres`, were
+        released within [year_min, year_max] and are rated at least
+        `min_rating`; None when no filter is set
+        """
+        masks = []
+        for genre in genres or ():
+            bitmap = self.genres.get(genre.lower())
+            masks.append(bitmap if bitmap is not None else np.zeros(self.size, dtype=bool))
+        if year_min is not None or year_max is not None:
+            # Movies without a release date never match a year filter
+            masks.append(self._range(self.year_order, self.years, max(year_min or 1, 1), year_max))
+        if min_rating is not None:
+            masks.append(self._range(self.rating_order, self.ratings, min_rating, None))
+        if not masks:
+            return None
+        mask = masks[0].copy()
+        for other in masks[1:]:
+            mask &= other
+        return mask
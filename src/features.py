@@ -0,0 +1,139 @@
+import re
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from .metrics import timed
+
+# Relative weight of each field's TF-IDF block. Applied as a multiplier on
+# the term frequencies, so a weight of 3 is the same as repeating the text
+# three times, but without tokenizing it three times.
+FIELD_WEIGHTS = {
+    "overview": 3.0,
+    "genres": 2.0,
+    "actors": 1.0,
+    "directors": 1.0,
+    "franchise": 5.0,
+}
+
+# Fields whose values are lists of names; each name is kept as one token
+LIST_FIELDS = ("genres", "actors", "directors")
+
+# Extract the franchise name from the title (like "Alien" or "Star Wars")
+def extract_franchise_name(title):
+    # Split on common franchise separators and get the first part
+    separators = [":", " - ", " – ", ",", ".", "Part", "Chapter", "Volume"]
+    base_title = title
+    for sep in separators:
+        if sep in title:
+            base_title = title.split(sep)[0].strip()
+            break
+
+    # Handle numbered sequels (e.g., "Alien 3", "Terminator 2")
+    base_title = re.sub(r'\s+\d+$', '', base_title).strip()
+
+    # Return the first 1-3 words which often indicate the franchise
+    words = base_title.split()
+    franchise = " ".join(words[:min(3, len(words))])
+    return franchise
+
+def _name_tokens(names):
+    # Module level (not a lambda) so fitted vectorizers stay picklable
+    return [name.lower() for name in names]
+
+def make_vectorizer(field):
+    """Unfitted vectorizer for one field"""
+    if field in LIST_FIELDS:
+        return TfidfVectorizer(analyzer=_name_tokens, norm=None)
+    return TfidfVectorizer(stop_words='english', norm=None)
+
+def field_documents(movies_df):
+    """The token source for each field, computed once per movie"""
+    def as_list(values):
+        return [v if isinstance(v, list) else [] for v in values]
+
+    return {
+        "overview": movies_df["overview"].fillna("").tolist(),
+        "genres": as_list(movies_df["genres"]),
+        "actors": as_list(movies_df["actors"]),
+        "directors": as_list(movies_df["directors"]),
+        "franchise": [extract_franchise_name(title) for title in movies_df["title"]],
+    }
+
+class FeaturePipeline:
+    """
+    Per-field TF-IDF blocks combined with `scipy.sparse.hstack`.
+    Each field is tokenized once into its own block; the blocks are scaled
+    by the field weights and the combined rows are L2-normalized.
+    """
+
+    def __init__(self, weights=None, vectorizers=None):
+        self.weights = dict(FIELD_WEIGHTS if weights is None else weights)
+        self.vectorizers = vectorizers or {}
+        self.blocks = {}
+
+    @timed("tfidf_fit")
+    def fit_transform(self, movies_df):
+        """Fit one vectorizer per field and return the combined matrix"""
+        docs = field_documents(movies_df)
+        for field in self.weights:
+            vectorizer = make_vectorizer(field)
+            try:
+                block = vectorizer.fit_transform(docs[field])
+            except ValueError:
+                # Empty vocabulary (e.g. a field that's blank everywhere)
+                vectorizer = None
+                block = sparse.csr_matrix((len(movies_df), 0))
+            self.vectorizers[field] = vectorizer
+            self.blocks[field] = block
+        return self.combine()
+
+    def transform(self, movies_df):
+        """Combined feature rows for movies using the fitted vocabularies"""
+        docs = field_documents(movies_df)
+        blocks = {}
+        for field in self.weights:
+            vectorizer = self.vectorizers.get(field)
+            if vectorizer is None:
+                blocks[field] = sparse.csr_matrix((len(movies_df), 0))
+            else:
+                blocks[field] = vectorizer.transform(docs[field])
+        return self.combine(blocks=blocks)
+
+    def combine(self, weights=None, blocks=None):
+        """
+        Stack the field blocks with the given weights. Re-weighting the
+        fitted blocks this way does not retokenize anything.
+        """
+        weights = self.weights if weights is None else weights
+        blocks = self.blocks if blocks is None else blocks
+        scaled = [blocks[field] * float(weights.get(field, 0.0)) for field in self.weights]
+        matrix = sparse.hstack(scaled, format="csr")
+        return normalize(matrix, norm="l2", copy=False)
+
+    def state(self):
+        """Vocabularies and IDF vectors of the fitted fields, for persistence"""
+        vocabularies, idfs = {}, {}
+        for field, vectorizer in self.vectorizers.items():
+            if vectorizer is None:
+                vocabularies[field], idfs[field] = {}, np.zeros(0)
+            else:
+                vocabularies[field] = {term: int(col) for term, col in vectorizer.vocabulary_.items()}
+                idfs[field] = vectorizer.idf_
+        return vocabularies, idfs
+
+    @classmethod
+    def from_state(cls, weights, vocabularies, idfs):
+        """Rebuild a fitted pipeline from persisted vocabularies and IDF vectors"""
+        vectorizers = {}
+        for field in weights:
+            if not vocabularies.get(field):
+                vectorizers[field] = None
+                continue
+            vectorizer = make_vectorizer(field)
+            vectorizer.vocabulary_ = vocabularies[field]
+            vectorizer.idf_ = idfs[field]
+            vectorizers[field] = vectorizer
+        return cls(weights, vectorizers)
@@ -2,78 +2,186 @@ import requests
 import os
 import json
 import time
+import random
 import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 from pathlib import Path
 from tqdm import tqdm
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("tmdb_fetch.log"),
-        logging.StreamHandler()
-    ]
-)
+from .storage import CatalogLog, catalog_hash, columnar_path_for, export_columnar
+
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 API_KEY = os.getenv("TMDB_API_KEY")
-BASE_URL = "https://api.themoviedb.org/3"
+BASE_URL = os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3")
+
+# TMDb allows roughly 40-50 requests per second per IP
+RATE_LIMIT = float(os.getenv("TMDB_RATE_LIMIT", "40"))  # requests per second
+MAX_CONCURRENCY = int(os.getenv("TMDB_CONCURRENCY", "16"))  # parallel detail fetches
+MAX_RETRIES = 5
+REQUEST_TIMEOUT = 10
+
+# Last successful sync, used by incremental refreshes
+SYNC_STATE_FILE = "data/tmdb_sync.json"
+CHANGES_WINDOW_DAYS = 14  # Longest date range /movie/changes accepts
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every request of a client"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold back every caller for `seconds` (e.g. after a 429)"""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+def _retry_after(response):
+    """Seconds to wait according to a Retry-After header, or None"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+class TMDbClient:
+    """
+    Pooled, rate-limited TMDb API client, safe to share between threads.
+    Retries 429s and 5xx responses with exponential backoff, honoring
+    Retry-After. Point `base_url` at a local stub server for testing.
+    """
+
+    def __init__(self, api_key=API_KEY, base_url=BASE_URL, rate=RATE_LIMIT,
+                 concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES, timeout=REQUEST_TIMEOUT):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.limiter = TokenBucket(rate)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _backoff(self, attempt):
+        return min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def get(self, path, **params):
+        params = {"api_key": self.api_key, **params}
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                r = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"{path}: {e}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if r.status_code == 429 or r.status_code >= 500:
+                if attempt == self.max_retries:
+                    r.raise_for_status()
+                delay = _retry_after(r)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                if r.status_code == 429:
+                    # Slow down every thread, not just this one
+                    self.limiter.pause(delay)
+                logger.warning(f"{path}: HTTP {r.status_code}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            r.raise_for_status()
+            return r.json()
+
+    def close(self):
+        self.session.close()
+
+_client = None
+
+def default_client():
+    """Client shared by the module-level fetch helpers"""
+    global _client
+    if _client is None:
+        _client = TMDbClient()
+    return _client
 
 # Fetch popular movies 
-def fetch_popular_movies(page=1):
-    params = {"api_key": API_KEY, "language": "en-US", "page": page}
-    r = requests.get(f"{BASE_URL}/movie/popular", params=params)
-    r.raise_for_status()
-    return r.json()["results"]
+def fetch_popular_movies(page=1, client=None):
+    client = client or default_client()
+    return client.get("/movie/popular", language="en-US", page=page)["results"]
 
 # Fetch top rated movies
-def fetch_top_rated_movies(page=1):
-    params = {"api_key": API_KEY, "language": "en-US", "page": page}
-    r = requests.get(f"{BASE_URL}/movie/top_rated", params=params)
-    r.raise_for_status()
-    return r.json()["results"]
+def fetch_top_rated_movies(page=1, client=None):
+    client = client or default_client()
+    return client.get("/movie/top_rated", language="en-US", page=page)["results"]
 
 # Fetch movies by genre
-def fetch_movies_by_genre(genre_id, page=1):
-    params = {"api_key": API_KEY, "language": "en-US", "page": page, "with_genres": genre_id}
-    r = requests.get(f"{BASE_URL}/discover/movie", params=params)
-    r.raise_for_status()
-    return r.json()["results"]
+def fetch_movies_by_genre(genre_id, page=1, client=None):
+    client = client or default_client()
+    return client.get("/discover/movie", language="en-US", page=page, with_genres=genre_id)["results"]
 
 # Fetch trending movies
-def fetch_trending_movies(time_window="week", page=1):
-    params = {"api_key": API_KEY, "language": "en-US", "page": page}
-    r = requests.get(f"{BASE_URL}/trending/movie/{time_window}", params=params)
-    r.raise_for_status()
-    return r.json()["results"]
+def fetch_trending_movies(time_window="week", page=1, client=None):
+    client = client or default_client()
+    return client.get(f"/trending/movie/{time_window}", language="en-US", page=page)["results"]
 
 # Fetch upcoming movies
-def fetch_upcoming_movies(page=1):
-    params = {"api_key": API_KEY, "language": "en-US", "page": page}
-    r = requests.get(f"{BASE_URL}/movie/upcoming", params=params)
-    r.raise_for_status()
-    return r.json()["results"]
+def fetch_upcoming_movies(page=1, client=None):
+    client = client or default_client()
+    return client.get("/movie/upcoming", language="en-US", page=page)["results"]
 
 # Get list of genres
-def get_genres():
-    params = {"api_key": API_KEY, "language": "en-US"}
-    r = requests.get(f"{BASE_URL}/genre/movie/list", params=params)
-    r.raise_for_status()
-    return r.json()["genres"]
-
-def get_movie_details(movie_id):
-    params = {"api_key": API_KEY, "append_to_response": "credits"}
-    r = requests.get(f"{BASE_URL}/movie/{movie_id}", params=params)
-    r.raise_for_status()
-    return r.json()
-
-def extract_metadata(movie):
+def get_genres(client=None):
+    client = client or default_client()
+    return client.get("/genre/movie/list", language="en-US")["genres"]
+
+def get_movie_details(movie_id, client=None):
+    client = client or default_client()
+    return client.get(f"/movie/{movie_id}", append_to_response="credits")
+
+def extract_metadata(movie, client=None):
     # Extracts title, overview, genres, actors, directors, release year
-    details = get_movie_details(movie["id"])
+    details = get_movie_details(movie["id"], client)
     genres = [g["name"] for g in details.get("genres", [])]
     actors = [c["name"] for c in details.get("credits", {}).get("cast", [])[:5]]
     directors = [c["name"] for c in details.get("credits", {}).get("crew", []) if c["job"] == "Director"]
@@ -97,19 +205,23 @@ def extract_metadata(movie):
         "vote_average": details.get("vote_average", 0)
     }
 
-def save_progress(all_movies, filename="data/tmdb_movies.json"):
-    """Save current progress to file"""
-    os.makedirs("data", exist_ok=True)
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(all_movies, f, ensure_ascii=False, indent=2)
-    logger.info(f"Saved {len(all_movies)} movies to {filename}")
+def save_progress(new_movies, storage=None):
+    """Append newly fetched (or updated) movies to the catalog storage"""
+    storage = storage or CatalogLog()
+    storage.append(new_movies)
+    logger.info(f"Saved {len(new_movies)} movies to {storage.path}")
+
+def export_catalog(all_movies, storage=None):
+    """Refresh the columnar (Parquet) export the server loads from"""
+    storage = storage or CatalogLog()
+    export_columnar(all_movies, catalog_hash(storage.path), columnar_path_for(storage.path))
 
-def load_existing_data(filename="data/tmdb_movies.json"):
+def load_existing_data(storage=None):
     """Load existing data if available"""
+    storage = storage or CatalogLog()
     try:
-        if os.path.exists(filename):
-            with open(filename, "r", encoding="utf-8") as f:
-                existing_data = json.load(f)
+        if storage.exists():
+            existing_data = storage.read()
             logger.info(f"Loaded {len(existing_data)} movies from existing file")
             return existing_data, {movie["id"] for movie in existing_data}
     except Exception as e:
@@ -117,312 +229,328 @@ def load_existing_data(filename="data/tmdb_movies.json"):
     return [], set()
 
 # Fetch movies from a specific year range
-def fetch_movies_by_year(start_year, end_year, page=1):
+def fetch_movies_by_year(start_year, end_year, page=1, client=None):
+    client = client or default_client()
     params = {
-        "api_key": API_KEY, 
         "language": "en-US", 
         "page": page,
         "primary_release_date.gte": f"{start_year}-01-01",
         "primary_release_date.lte": f"{end_year}-12-31",
         "sort_by": "popularity.desc"
     }
-    r = requests.get(f"{BASE_URL}/discover/movie", params=params)
-    r.raise_for_status()
-    return r.json()["results"]
+    return client.get("/discover/movie", **params)["results"]
 
-def main():
-    # Try to load existing data first
-    all_movies, movie_ids = load_existing_data()
-    
-    # Set target to 10,000 movies
-    target_count = 10000  # Target number of movies to fetch
-    
-    logger.info(f"Starting to fetch {target_count} movies from TMDb (already have {len(all_movies)})...")
-    
-    # New - First specifically target 2024-2025 movies
-    logger.info("\nPrioritizing movies from 2024-2025...")
-    
-    # Get 2024-2025 movies first (prioritize recent content)
-    max_pages_recent = 50  # Fetch many pages of recent content
-    recent_movie_count = 0  # Track how many 2024-2025 movies we've found
-    target_recent_movies = 1000  # Try to get at least 1000 recent movies if available
-    
-    for page in tqdm(range(1, max_pages_recent + 1), desc="2024-2025 movies"):
-        if recent_movie_count >= target_recent_movies:
-            logger.info(f"Reached target of {target_recent_movies} movies from 2024-2025!")
-            break
-            
+class Crawler:
+    """
+    Walks TMDb list endpoints page by page and fetches the details of every
+    new movie concurrently on a bounded thread pool. All requests go
+    through one TMDbClient, so the rate limit is shared.
+    """
+
+    def __init__(self, all_movies, movie_ids, target_count, client=None, concurrency=MAX_CONCURRENCY, storage=None):
+        self.all_movies = all_movies
+        self.movie_ids = movie_ids
+        self.target_count = target_count
+        self.client = client or default_client()
+        self.storage = storage or CatalogLog()
+        self.pool = ThreadPoolExecutor(max_workers=concurrency)
+        # Fetched but not yet appended to storage
+        self.unsaved = []
+
+    def done(self):
+        return len(self.movie_ids) >= self.target_count
+
+    def _extract(self, movie):
         try:
-            recent_movies = fetch_movies_by_year(2024, 2025, page)
-            if not recent_movies:
-                logger.info("No more 2024-2025 movies found.")
-                break
-                
-            for movie in recent_movies:
-                if movie["id"] not in movie_ids:
-                    movie_ids.add(movie["id"])
-                    try:
-                        meta = extract_metadata(movie)
-                        all_movies.append(meta)
-                        recent_movie_count += 1
-                        
-                        # Save progress more frequently for recent movies
-                        if len(all_movies) % 25 == 0:
-                            logger.info(f"Progress: {len(all_movies)}/{target_count} movies (Recent: {recent_movie_count})")
-                            save_progress(all_movies)
-                    except Exception as e:
-                        logger.error(f"Error fetching {movie.get('title', 'unknown')}: {e}")
-            
-            time.sleep(0.25)  # Rate limiting
+            return extract_metadata(movie, self.client)
         except Exception as e:
-            logger.error(f"Error fetching 2024-2025 movies page {page}: {e}")
-            time.sleep(1)  # Wait a bit longer after an error
-            
-    logger.info(f"Found {recent_movie_count} movies from 2024-2025")
-    
-    # Continue with the regular fetch process
-    # 1. Start with Popular movies (up to 500 pages)
-    max_pages_popular = 500
-    
-    logger.info("\nFetching popular movies...")
-    for page in tqdm(range(1, max_pages_popular + 1), desc="Popular movies"):
-        if len(movie_ids) >= target_count:
-            break
-            
-        try:
-            popular = fetch_popular_movies(page)
-            if not popular:  # If we get an empty response, we've reached the end
+            logger.error(f"Error fetching {movie.get('title', 'unknown')}: {e}")
+            return None
+
+    def add_movies(self, movies, respect_target=True, save_every=50):
+        """Fetch metadata for the unseen movies of a page in parallel; returns how many were added"""
+        new_movies = []
+        for movie in movies:
+            if respect_target and len(self.movie_ids) >= self.target_count:
                 break
-                
-            for movie in popular:
-                if movie["id"] not in movie_ids and len(movie_ids) < target_count:
-                    movie_ids.add(movie["id"])
-                    try:
-                        meta = extract_metadata(movie)
-                        all_movies.append(meta)
-                        
-                        # Save progress every 50 movies
-                        if len(all_movies) % 50 == 0:
-                            logger.info(f"Progress: {len(all_movies)}/{target_count} movies")
-                            save_progress(all_movies)
-                    except Exception as e:
-                        logger.error(f"Error fetching {movie.get('title', 'unknown')}: {e}")
-            
-            time.sleep(0.25)  # Rate limiting
-        except Exception as e:
-            logger.error(f"Error fetching popular movies page {page}: {e}")
-            time.sleep(1)  # Wait a bit longer after an error
-    
-    # 2. If we still need more, add top-rated movies
-    if len(movie_ids) < target_count:
-        logger.info("\nFetching top-rated movies...")
-        max_pages_top = 500
-        
-        for page in tqdm(range(1, max_pages_top + 1), desc="Top-rated movies"):
-            if len(movie_ids) >= target_count:
+            if movie["id"] not in self.movie_ids:
+                self.movie_ids.add(movie["id"])
+                new_movies.append(movie)
+
+        added = 0
+        for meta in self.pool.map(self._extract, new_movies):
+            if meta is not None:
+                self.all_movies.append(meta)
+                self.unsaved.append(meta)
+                added += 1
+
+        if len(self.unsaved) >= save_every:
+            logger.info(f"Progress: {len(self.all_movies)}/{self.target_count} movies")
+            self.flush()
+        return added
+
+    def flush(self):
+        """Append everything fetched since the last save"""
+        if self.unsaved:
+            save_progress(self.unsaved, self.storage)
+            self.unsaved = []
+
+    def crawl(self, desc, fetch_page, max_pages, limit=None, respect_target=True, save_every=50):
+        """
+        Fetch pages 1..max_pages of a list endpoint until it runs dry, `limit`
+        movies were added, or (with `respect_target`) the target is reached
+        """
+        added = 0
+        for page in tqdm(range(1, max_pages + 1), desc=desc):
+            if limit is not None and added >= limit:
                 break
-                
-            try:
-                top_rated = fetch_top_rated_movies(page)
-                if not top_rated:
-                    break
-                    
-                for movie in top_rated:
-                    if movie["id"] not in movie_ids and len(movie_ids) < target_count:
-                        movie_ids.add(movie["id"])
-                        try:
-                            meta = extract_metadata(movie)
-                            all_movies.append(meta)
-                            
-                            # Save progress every 50 movies
-                            if len(all_movies) % 50 == 0:
-                                logger.info(f"Progress: {len(all_movies)}/{target_count} movies")
-                                save_progress(all_movies)
-                        except Exception as e:
-                            logger.error(f"Error fetching {movie.get('title', 'unknown')}: {e}")
-                
-                time.sleep(0.25)  # Rate limiting
-            except Exception as e:
-                logger.error(f"Error fetching top-rated movies page {page}: {e}")
-                time.sleep(1)  # Wait longer after an error
-    
-    # 3. If we still need more, add trending movies
-    if len(movie_ids) < target_count:
-        logger.info("\nFetching trending movies (weekly)...")
-        max_pages_trending = 100
-        
-        for page in tqdm(range(1, max_pages_trending + 1), desc="Trending movies"):
-            if len(movie_ids) >= target_count:
+            if respect_target and self.done():
                 break
-                
             try:
-                trending = fetch_trending_movies("week", page)
-                if not trending:
-                    break
-                    
-                for movie in trending:
-                    if movie["id"] not in movie_ids and len(movie_ids) < target_count:
-                        movie_ids.add(movie["id"])
-                        try:
-                            meta = extract_metadata(movie)
-                            all_movies.append(meta)
-                            
-                            # Save progress every 50 movies
-                            if len(all_movies) % 50 == 0:
-                                logger.info(f"Progress: {len(all_movies)}/{target_count} movies")
-                                save_progress(all_movies)
-                        except Exception as e:
-                            logger.error(f"Error fetching {movie.get('title', 'unknown')}: {e}")
-                
-                time.sleep(0.25)  # Rate limiting
+                movies = fetch_page(page)
             except Exception as e:
-                logger.error(f"Error fetching trending movies page {page}: {e}")
-                time.sleep(1)  # Wait longer after an error
-    
-    # 4. If we still need more, add upcoming movies
-    if len(movie_ids) < target_count:
-        logger.info("\nFetching upcoming movies...")
-        max_pages_upcoming = 50
-        
-        for page in tqdm(range(1, max_pages_upcoming + 1), desc="Upcoming movies"):
-            if len(movie_ids) >= target_count:
+                logger.error(f"Error fetching {desc} page {page}: {e}")
+                continue
+            if not movies:  # If we get an empty response, we've reached the end
                 break
-                
-            try:
-                upcoming = fetch_upcoming_movies(page)
-                if not upcoming:
-                    break
-                    
-                for movie in upcoming:
-                    if movie["id"] not in movie_ids and len(movie_ids) < target_count:
-                        movie_ids.add(movie["id"])
-                        try:
-                            meta = extract_metadata(movie)
-                            all_movies.append(meta)
-                            
-                            # Save progress every 50 movies
-                            if len(all_movies) % 50 == 0:
-                                logger.info(f"Progress: {len(all_movies)}/{target_count} movies")
-                                save_progress(all_movies)
-                        except Exception as e:
-                            logger.error(f"Error fetching {movie.get('title', 'unknown')}: {e}")
-                
-                time.sleep(0.25)  # Rate limiting
-            except Exception as e:
-                logger.error(f"Error fetching upcoming movies page {page}: {e}")
-                time.sleep(1)  # Wait longer after an error
+            added += self.add_movies(movies, respect_target, save_every)
+        return added
+
+    def close(self):
+        self.pool.shutdown()
+        self.flush()
+
+def main(client=None, target_count=10000, storage=None, respect_target=False):
+    """
+    Crawl until the catalog holds `target_count` movies. The 2024-2025 pass
+    runs first and keeps going past the target (up to its own limit)
+    unless `respect_target` is set.
+    """
+    client = client or default_client()
+    storage = storage or CatalogLog()
+    started = datetime.now(timezone.utc)
+
+    # Try to load existing data first
+    all_movies, movie_ids = load_existing_data(storage)
+    
+    # Target number of movies to fetch (10,000 by default)
     
-    # 5. Add movies by decade to ensure a good historical range
-    decades = [
-        (2024, 2025, "2024-2025"),  # Latest movies first
-        (2020, 2023, "2020-2023"),
-        (2010, 2019, "2010s"),
-        (2000, 2009, "2000s"),
-        (1990, 1999, "1990s"),
-        (1980, 1989, "1980s"),
-        (1970, 1979, "1970s"),
-        (1960, 1969, "1960s"),
-        (1950, 1959, "1950s"),
-        (1940, 1949, "1940s"),
-        (1930, 1939, "1930s"),
-        (1920, 1929, "1920s"),
-        (1900, 1919, "Pre-1920s")
-    ]
+    logger.info(f"Starting to fetch {target_count} movies from TMDb (already have {len(all_movies)})...")
+    crawler = Crawler(all_movies, movie_ids, target_count, client, storage=storage)
     
-    if len(movie_ids) < target_count:
-        logger.info("\nFetching movies by decade...")
+    try:
+        # New - First specifically target 2024-2025 movies
+        logger.info("\nPrioritizing movies from 2024-2025...")
         
-        for start_year, end_year, decade_name in decades:
-            if len(movie_ids) >= target_count:
-                break
-                
-            logger.info(f"Fetching {decade_name} movies...")
-            
-            # Special handling for recent years - fetch more pages to prioritize newest movies
-            if decade_name == "2024-2025":
-                max_pages_decade = 100  # More pages for newest movies
-            else:
-                max_pages_decade = 30  # Regular amount for other decades
+        # Get 2024-2025 movies first (prioritize recent content)
+        max_pages_recent = 50  # Fetch many pages of recent content
+        target_recent_movies = 1000  # Try to get at least 1000 recent movies if available
+        
+        recent_movie_count = crawler.crawl(
+            "2024-2025 movies",
+            lambda page: fetch_movies_by_year(2024, 2025, page, client),
+            max_pages_recent,
+            limit=target_recent_movies,
+            respect_target=respect_target,
+            save_every=25,  # Save progress more frequently for recent movies
+        )
+        if recent_movie_count >= target_recent_movies:
+            logger.info(f"Reached target of {target_recent_movies} movies from 2024-2025!")
+        logger.info(f"Found {recent_movie_count} movies from 2024-2025")
+        
+        # Continue with the regular fetch process
+        # 1. Start with Popular movies (up to 500 pages)
+        logger.info("\nFetching popular movies...")
+        crawler.crawl("Popular movies", lambda page: fetch_popular_movies(page, client), 500)
+        
+        # 2. If we still need more, add top-rated movies
+        if not crawler.done():
+            logger.info("\nFetching top-rated movies...")
+            crawler.crawl("Top-rated movies", lambda page: fetch_top_rated_movies(page, client), 500)
+        
+        # 3. If we still need more, add trending movies
+        if not crawler.done():
+            logger.info("\nFetching trending movies (weekly)...")
+            crawler.crawl("Trending movies", lambda page: fetch_trending_movies("week", page, client), 100)
+        
+        # 4. If we still need more, add upcoming movies
+        if not crawler.done():
+            logger.info("\nFetching upcoming movies...")
+            crawler.crawl("Upcoming movies", lambda page: fetch_upcoming_movies(page, client), 50)
+        
+        # 5. Add movies by decade to ensure a good historical range
+        decades = [
+            (2024, 2025, "2024-2025"),  # Latest movies first
+            (2020, 2023, "2020-2023"),
+            (2010, 2019, "2010s"),
+            (2000, 2009, "2000s"),
+            (1990, 1999, "1990s"),
+            (1980, 1989, "1980s"),
+            (1970, 1979, "1970s"),
+            (1960, 1969, "1960s"),
+            (1950, 1959, "1950s"),
+            (1940, 1949, "1940s"),
+            (1930, 1939, "1930s"),
+            (1920, 1929, "1920s"),
+            (1900, 1919, "Pre-1920s")
+        ]
+        
+        if not crawler.done():
+            logger.info("\nFetching movies by decade...")
             
-            for page in tqdm(range(1, max_pages_decade + 1), desc=f"{decade_name} movies"):
-                if len(movie_ids) >= target_count:
+            for start_year, end_year, decade_name in decades:
+                if crawler.done():
                     break
                     
-                try:
-                    decade_movies = fetch_movies_by_year(start_year, end_year, page)
-                    if not decade_movies:
-                        break
-                        
-                    for movie in decade_movies:
-                        if movie["id"] not in movie_ids and len(movie_ids) < target_count:
-                            movie_ids.add(movie["id"])
-                            try:
-                                meta = extract_metadata(movie)
-                                all_movies.append(meta)
-                                
-                                # Save progress every 50 movies
-                                if len(all_movies) % 50 == 0:
-                                    logger.info(f"Progress: {len(all_movies)}/{target_count} movies")
-                                    save_progress(all_movies)
-                            except Exception as e:
-                                logger.error(f"Error fetching {movie.get('title', 'unknown')}: {e}")
-                    
-                    time.sleep(0.25)  # Rate limiting
-                except Exception as e:
-                    logger.error(f"Error fetching {decade_name} movies page {page}: {e}")
-                    time.sleep(1)  # Wait longer after an error
-    
-    # 6. If we still need more, fetch by major genres
-    if len(movie_ids) < target_count:
-        logger.info("\nFetching movies from major genres...")
-        # Common genre IDs: Action=28, Comedy=35, Drama=18, Sci-Fi=878, Thriller=53
-        genres = [(28, "Action"), (35, "Comedy"), (18, "Drama"), (878, "Sci-Fi"), (53, "Thriller"),
-                 (27, "Horror"), (10749, "Romance"), (16, "Animation"), (12, "Adventure"), (80, "Crime"),
-                 (14, "Fantasy"), (36, "History"), (10402, "Music"), (9648, "Mystery"), 
-                 (10752, "War"), (37, "Western")]
-        
-        max_pages_per_genre = 50  # 50 pages per genre (increased from 5)
-        
-        for genre_id, genre_name in genres:
-            if len(movie_ids) >= target_count:
-                break
+                logger.info(f"Fetching {decade_name} movies...")
                 
-            logger.info(f"Fetching {genre_name} movies...")
+                # Special handling for recent years - fetch more pages to prioritize newest movies
+                if decade_name == "2024-2025":
+                    max_pages_decade = 100  # More pages for newest movies
+                else:
+                    max_pages_decade = 30  # Regular amount for other decades
+                
+                crawler.crawl(
+                    f"{decade_name} movies",
+                    lambda page, start=start_year, end=end_year: fetch_movies_by_year(start, end, page, client),
+                    max_pages_decade,
+                )
+        
+        # 6. If we still need more, fetch by major genres
+        if not crawler.done():
+            logger.info("\nFetching movies from major genres...")
+            # Common genre IDs: Action=28, Comedy=35, Drama=18, Sci-Fi=878, Thriller=53
+            genres = [(28, "Action"), (35, "Comedy"), (18, "Drama"), (878, "Sci-Fi"), (53, "Thriller"),
+                     (27, "Horror"), (10749, "Romance"), (16, "Animation"), (12, "Adventure"), (80, "Crime"),
+                     (14, "Fantasy"), (36, "History"), (10402, "Music"), (9648, "Mystery"), 
+                     (10752, "War"), (37, "Western")]
             
-            for page in tqdm(range(1, max_pages_per_genre + 1), desc=f"{genre_name} movies"):
-                if len(movie_ids) >= target_count:
+            max_pages_per_genre = 50  # 50 pages per genre (increased from 5)
+            
+            for genre_id, genre_name in genres:
+                if crawler.done():
                     break
                     
-                try:
-                    genre_movies = fetch_movies_by_genre(genre_id, page)
-                    if not genre_movies:
-                        break
-                        
-                    for movie in genre_movies:
-                        if movie["id"] not in movie_ids and len(movie_ids) < target_count:
-                            movie_ids.add(movie["id"])
-                            try:
-                                meta = extract_metadata(movie)
-                                all_movies.append(meta)
-                                
-                                # Save progress every 50 movies
-                                if len(all_movies) % 50 == 0:
-                                    logger.info(f"Progress: {len(all_movies)}/{target_count} movies")
-                                    save_progress(all_movies)
-                            except Exception as e:
-                                logger.error(f"Error fetching {movie.get('title', 'unknown')}: {e}")
-                    
-                    time.sleep(0.25)  # Rate limiting
-                except Exception as e:
-                    logger.error(f"Error fetching {genre_name} movies page {page}: {e}")
-                    time.sleep(1)  # Wait longer after an error
+                logger.info(f"Fetching {genre_name} movies...")
+                crawler.crawl(
+                    f"{genre_name} movies",
+                    lambda page, genre=genre_id: fetch_movies_by_genre(genre, page, client),
+                    max_pages_per_genre,
+                )
+    finally:
+        crawler.close()
     
-    # Final save
+    # Everything was already appended when the crawler closed
     logger.info(f"\nTotal unique movies fetched: {len(all_movies)}")
-    save_progress(all_movies)
+    if storage.needs_compaction(len(all_movies)):
+        storage.compact(all_movies)
+    export_catalog(all_movies, storage)
+    save_sync_state({"last_sync": started.isoformat()})
     logger.info("Data collection complete!")
 
+def load_sync_state(filename=SYNC_STATE_FILE):
+    """Load the incremental sync state (last sync time), or an empty state"""
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_sync_state(state, filename=SYNC_STATE_FILE):
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_filename, filename)
+
+def fetch_changed_movie_ids(start_date, end_date, client=None):
+    """Ids of all movies TMDb reports as changed between two dates (at most 14 days apart)"""
+    client = client or default_client()
+    changed = set()
+    page = 1
+    while True:
+        data = client.get("/movie/changes", start_date=start_date.isoformat(), end_date=end_date.isoformat(), page=page)
+        changed.update(item["id"] for item in data.get("results", []))
+        if page >= data.get("total_pages", 1):
+            break
+        page += 1
+    return changed
+
+def refresh(client=None, since=None, concurrency=MAX_CONCURRENCY, storage=None):
+    """
+    Incrementally refresh the catalog: ask TMDb which movies changed since
+    the last sync, refetch only those we have, and patch them in place.
+    Returns the ids of the movies whose metadata actually changed.
+    """
+    client = client or default_client()
+    storage = storage or CatalogLog()
+    started = datetime.now(timezone.utc)
+    
+    all_movies, movie_ids = load_existing_data(storage)
+    if not all_movies:
+        logger.error("No existing catalog to refresh, run a full fetch first")
+        return []
+    
+    if since is None:
+        last_sync = load_sync_state().get("last_sync")
+        if last_sync:
+            since = datetime.fromisoformat(last_sync)
+        else:
+            since = started - timedelta(days=CHANGES_WINDOW_DAYS)
+            logger.warning(f"No previous sync recorded, checking changes since {since.date()}")
+    
+    # Walk the change feed in windows TMDb accepts
+    changed = set()
+    window_start = since
+    while window_start < started:
+        window_end = min(window_start + timedelta(days=CHANGES_WINDOW_DAYS), started)
+        changed |= fetch_changed_movie_ids(window_start.date(), window_end.date(), client)
+        window_start = window_end
+    changed_ids = sorted(changed & movie_ids)
+    logger.info(f"{len(changed)} movies changed on TMDb since {since.isoformat()}, {len(changed_ids)} in our catalog")
+    
+    def fetch(movie_id):
+        try:
+            return extract_metadata({"id": movie_id}, client)
+        except Exception as e:
+            logger.error(f"Error refreshing movie {movie_id}: {e}")
+            return None
+    
+    positions = {movie["id"]: i for i, movie in enumerate(all_movies)}
+    updated_ids = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for movie_id, meta in zip(changed_ids, pool.map(fetch, changed_ids)):
+            position = positions[movie_id]
+            if meta is not None and meta != all_movies[position]:
+                all_movies[position] = meta
+                updated_ids.append(movie_id)
+    
+    if updated_ids:
+        # Superseding lines keep each movie's position in the catalog
+        save_progress([all_movies[positions[movie_id]] for movie_id in updated_ids], storage)
+        if storage.needs_compaction(len(all_movies)):
+            storage.compact(all_movies)
+        export_catalog(all_movies, storage)
+    save_sync_state({"last_sync": started.isoformat()})
+    logger.info(f"Refreshed {len(updated_ids)} movies")
+    return updated_ids
+
 if __name__ == "__main__":
+    # Setup logging (only when run as a script, so importing the crawler
+    # doesn't create tmdb_fetch.log in the caller's directory)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler("tmdb_fetch.log"),
+            logging.StreamHandler()
+        ]
+    )
+    parser = argparse.ArgumentParser(description="Fetch movie data from TMDb")
+    parser.add_argument("--refresh", action="store_true",
+                        help="only refetch movies that changed on TMDb since the last sync")
+    args = parser.parse_args()
+    
     try:
         # Try to import tqdm, install if not available
         try:
@@ -433,13 +561,22 @@ if __name__ == "__main__":
             subprocess.check_call(["pip", "install", "tqdm"])
             from tqdm import tqdm
             
+        if args.refresh:
+            updated_ids = refresh()
+            if updated_ids:
+                # Patch only the affected rows of the model artifact
+                from .recommend_enhanced import update_model
+                update_model(updated_ids)
+            print(f"\nRefresh complete! {len(updated_ids)} movies updated.")
+            raise SystemExit(0)
+            
         print(f"Starting fetch of up to 10,000 movies from TMDb...")
-        print("This process may take several hours. You can stop it at any time with Ctrl+C.")
+        print("This process may take several minutes. You can stop it at any time with Ctrl+C.")
         print("Progress will be saved periodically and can be resumed later.")
         
         main()
         
-        print("\nMovie fetching complete! Check data/tmdb_movies.json for results.")
+        print("\nMovie fetching complete! Check data/tmdb_movies.jsonl for results.")
     except KeyboardInterrupt:
         print("\n\nProcess interrupted by user. Progress has been saved and can be resumed later.")
     except Exception as e:
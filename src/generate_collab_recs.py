@@ -1,43 +1,121 @@
+import argparse
+import logging
+
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from surprise import Dataset, Reader, SVD
-from surprise.model_selection import train_test_split
 
-def train_model(ratings_df):
-    reader = Reader(rating_scale=(1, 5))
-    data = Dataset.load_from_df(ratings_df[['user_id', 'title', 'rating']], reader)
-    trainset = data.build_full_trainset()
-    algo = SVD()
-    algo.fit(trainset)
-    return algo
+from .collab import COLLAB_DIR, load_collab_model, save_collab_model
+from .profiles import PERSONAL_RATINGS, PERSONAL_USER_ID
+
+logger = logging.getLogger(__name__)
+
+MOVIELENS_RATINGS = "data/ml-latest-small/ratings.csv"
+MOVIELENS_MOVIES = "data/ml-latest-small/movies.csv"
+# movieId -> tmdbId, used to join collaborative scores to the TMDb catalog
+MOVIELENS_LINKS = "data/ml-latest-small/links.csv"
 
-def recommend_unseen_movies(ratings_file="data/ratings.csv", movies_file="data/ml-latest-small/movies.csv", num_recs=5):
-    # Load your personal ratings
-    ratings_df = pd.read_csv(ratings_file)
-    ratings_df['user_id'] = 1  # Only one user
+RATING_SCALE = (0.5, 5.0)
 
-    # Load movie metadata
+def load_ratings(ratings_file=MOVIELENS_RATINGS, movies_file=MOVIELENS_MOVIES,
+                 personal_file=PERSONAL_RATINGS, personal_user_id=PERSONAL_USER_ID):
+    """
+    Ratings of all users as a (user_id, item_id, rating) DataFrame, plus the
+    movie metadata. MovieLens ratings are read as is; personal ratings
+    are matched to MovieLens movies by title. Either file may be missing.
+    """
     movies_df = pd.read_csv(movies_file)
+    frames = []
+    try:
+        ratings = pd.read_csv(ratings_file, usecols=["userId", "movieId", "rating"])
+        frames.append(ratings.rename(columns={"userId": "user_id", "movieId": "item_id"}))
+    except FileNotFoundError:
+        logger.warning("No ratings at %s", ratings_file)
+    try:
+        personal = pd.read_csv(personal_file).merge(movies_df[["movieId", "title"]], on="title")
+        personal = personal.rename(columns={"movieId": "item_id"})
+        personal["user_id"] = personal_user_id
+        frames.append(personal[["user_id", "item_id", "rating"]])
+    except FileNotFoundError:
+        pass
+    if not frames:
+        raise FileNotFoundError(f"No ratings found in {ratings_file} or {personal_file}")
+    ratings_df = pd.concat(frames, ignore_index=True)
+    # A later rating of the same movie replaces an earlier one
+    ratings_df = ratings_df.drop_duplicates(["user_id", "item_id"], keep="last")
+    return ratings_df, movies_df
 
-    # Movies you've already rated
-    rated_titles = set(ratings_df['title'])
+def train_model(ratings_df, n_factors=100, n_epochs=20):
+    reader = Reader(rating_scale=RATING_SCALE)
+    data = Dataset.load_from_df(ratings_df[['user_id', 'item_id', 'rating']], reader)
+    trainset = data.build_full_trainset()
+    algo = SVD(n_factors=n_factors, n_epochs=n_epochs)
+    algo.fit(trainset)
+    return algo
 
-    # Movies you haven't rated yet
-    unseen_movies = movies_df[~movies_df['title'].isin(rated_titles)]
+def load_links(links_file=MOVIELENS_LINKS):
+    """MovieLens movieId -> TMDb id Series, empty if there is no links file"""
+    try:
+        links = pd.read_csv(links_file, usecols=["movieId", "tmdbId"]).dropna()
+    except FileNotFoundError:
+        logger.warning("No %s; collaborative scores will be joined to the catalog by title only", links_file)
+        return pd.Series(dtype=np.int64)
+    return links.set_index("movieId")["tmdbId"].astype(np.int64)
 
-    # Train the model
-    model = train_model(ratings_df)
+def export_model(algo, ratings_df, movies_df, links=None, collab_dir=COLLAB_DIR):
+    """Persist a fitted SVD's factors and biases in Surprise's inner id order"""
+    trainset = algo.trainset
+    user_ids = [trainset.to_raw_uid(inner) for inner in range(trainset.n_users)]
+    item_ids = [trainset.to_raw_iid(inner) for inner in range(trainset.n_items)]
+    titles = movies_df.set_index("movieId")["title"].reindex(item_ids).fillna("").tolist()
+    if links is None:
+        links = load_links()
+    tmdb_ids = links[~links.index.duplicated()].reindex(item_ids).fillna(-1).astype(np.int64).to_numpy()
 
-    # Predict ratings for unseen movies
-    predictions = []
-    for title in unseen_movies['title']:
-        pred = model.predict(uid=1, iid=title)
-        predictions.append((title, pred.est))
+    user_rows = ratings_df["user_id"].map({uid: row for row, uid in enumerate(user_ids)})
+    item_cols = ratings_df["item_id"].map({iid: col for col, iid in enumerate(item_ids)})
+    seen = sparse.csr_matrix(
+        (np.ones(len(ratings_df), dtype=np.int8), (user_rows.to_numpy(), item_cols.to_numpy())),
+        shape=(len(user_ids), len(item_ids)),
+    )
+    version = format(pd.util.hash_pandas_object(ratings_df, index=False).sum() & (2**64 - 1), "016x")
+    return save_collab_model(
+        version, user_ids, item_ids, titles, algo.pu, algo.qi, algo.bu, algo.bi,
+        trainset.global_mean, RATING_SCALE, seen, tmdb_ids, collab_dir,
+    )
 
-    # Sort and return top N
-    top_recs = sorted(predictions, key=lambda x: x[1], reverse=True)[:num_recs]
+def train(ratings_file=MOVIELENS_RATINGS, movies_file=MOVIELENS_MOVIES, personal_file=PERSONAL_RATINGS,
+          n_factors=100, n_epochs=20, collab_dir=COLLAB_DIR):
+    """Offline training step: fit on all ratings and write the model the server loads"""
+    ratings_df, movies_df = load_ratings(ratings_file, movies_file, personal_file)
+    logger.info("Training on %d ratings from %d users", len(ratings_df), ratings_df["user_id"].nunique())
+    algo = train_model(ratings_df, n_factors, n_epochs)
+    path = export_model(algo, ratings_df, movies_df, collab_dir=collab_dir)
+    logger.info("Collaborative model written to %s", path)
+    return path
+
+def recommend_unseen_movies(user_id=PERSONAL_USER_ID, num_recs=5, collab_dir=COLLAB_DIR):
+    model = load_collab_model(collab_dir)
+    if model is None:
+        print("No collaborative model yet; train one with: python -m src.generate_collab_recs --train")
+        return
+    recs = model.recommend(user_id, num_recs)
+    if recs is None:
+        print(f"User {user_id} has no ratings in the trained model")
+        return
     print("\n🎯 Top Recommended Movies Based on Your Ratings:\n")
-    for i, (title, score) in enumerate(top_recs, 1):
-        print(f"{i}. {title} (Predicted rating: {score:.2f})")
+    for i, rec in enumerate(recs, 1):
+        print(f"{i}. {rec['title']} (Predicted rating: {rec['predicted_rating']:.2f})")
 
 if __name__ == "__main__":
-    recommend_unseen_movies()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Train and query the collaborative filtering model")
+    parser.add_argument("--train", action="store_true", help="(Re)train on the MovieLens and personal ratings")
+    parser.add_argument("--user", default=str(PERSONAL_USER_ID), help="User to recommend for")
+    parser.add_argument("--count", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.train or load_collab_model() is None:
+        train()
+    recommend_unseen_movies(args.user, args.count)
@@ -0,0 +1,151 @@
+import os
+import re
+
+import numpy as np
+
+from .collab import get_collab_model
+from .metrics import span, timed
+from .neighbors import NEIGHBOR_K
+from .recommend_enhanced import RESULT_COLUMNS, get_engine
+from .scoring import top_k
+from .suggest_index import normalize_query
+
+# Blend weights of content similarity, collaborative predicted rating and
+# the vote_average prior. Weights of signals a request doesn't have (no
+# seed title, unknown user) are dropped and the rest renormalized.
+HYBRID_CONTENT_WEIGHT = float(os.getenv("HYBRID_CONTENT_WEIGHT", "0.6"))
+HYBRID_COLLAB_WEIGHT = float(os.getenv("HYBRID_COLLAB_WEIGHT", "0.3"))
+HYBRID_POPULARITY_WEIGHT = float(os.getenv("HYBRID_POPULARITY_WEIGHT", "0.1"))
+
+# Candidates retrieved from each source before the re-rank. Content
+# candidates come straight from the precomputed neighbor table.
+CONTENT_CANDIDATES = NEIGHBOR_K
+COLLAB_CANDIDATES = int(os.getenv("HYBRID_COLLAB_CANDIDATES", "200"))
+
+# "Matrix, The (1999)" -> "The Matrix"
+_year_re = re.compile(r"\s*\(\d{4}\)\s*$")
+_article_re = re.compile(r"^(.*), (The|A|An|L'|Le|La|Les|Il|Der|Die|Das|El)$", re.IGNORECASE)
+
+def movielens_title(title):
+    """A MovieLens title in the catalog's form, year dropped and article moved to the front"""
+    title = _year_re.sub("", title)
+    match = _article_re.match(title)
+    if match:
+        separator = "" if match.group(2).endswith("'") else " "
+        title = f"{match.group(2)}{separator}{match.group(1)}"
+    return title
+
+def map_items(engine, collab):
+    """
+    Catalog row of each collaborative item (-1 where unmatched), through
+    the TMDb ids from MovieLens links.csv and, failing that, the
+    normalized title
+    """
+    rows = engine.movies.rows(collab.tmdb_ids).astype(np.int64)
+    for item in np.flatnonzero(rows < 0).tolist():
+        row = engine.title_matcher.normalized.get(normalize_query(movielens_title(collab.titles[item])))
+        if row is not None:
+            rows[item] = row
+    return rows
+
+class HybridRanker:
+    """
+    Two-stage hybrid recommender. Retrieval takes the seed title's content
+    neighbors and the user's best collaborative items, a few hundred
+    candidates at most; the re-rank then blends exact content similarity,
+    the user's predicted rating and a vote_average prior over just those,
+    so latency stays flat as the catalog and the rating data grow.
+    """
+
+    def __init__(self, engine, collab=None, content_weight=HYBRID_CONTENT_WEIGHT,
+                 collab_weight=HYBRID_COLLAB_WEIGHT, popularity_weight=HYBRID_POPULARITY_WEIGHT):
+        self.engine = engine
+        self.collab = collab
+        self.weights = {"content": content_weight, "collab": collab_weight, "popularity": popularity_weight}
+        votes = engine.movies.column('vote_average').astype(np.float64)
+        # Movies without votes get the catalog average as their prior
+        self.popularity = np.nan_to_num(votes, nan=np.nanmean(votes) if np.isfinite(votes).any() else 0.0) / 10
+        if collab is not None:
+            self.row_for_item = map_items(engine, collab)
+            self.item_for_row = np.full(len(engine.movie_ids), -1, dtype=np.int64)
+            mapped = np.flatnonzero(self.row_for_item >= 0)
+            self.item_for_row[self.row_for_item[mapped]] = mapped
+
+    def _retrieve(self, seed_row, user_row):
+        # Stage 1: candidate catalog rows, minus the seed and the user's rated movies
+        candidates, excluded = [], []
+        if seed_row is not None:
+            indices, _ = self.engine.similar(seed_row, CONTENT_CANDIDATES + 1)
+            candidates.append(np.asarray(indices, dtype=np.int64))
+            excluded.append([seed_row])
+        if user_row is not None:
+            items, _ = self.collab.top_items(user_row, COLLAB_CANDIDATES)
+            rows = self.row_for_item[items]
+            candidates.append(rows[rows >= 0])
+            seen = self.row_for_item[self.collab.seen_items(user_row)]
+            excluded.append(seen[seen >= 0])
+        if not candidates:
+            return np.empty(0, dtype=np.int64)
+        rows = np.unique(np.concatenate(candidates))
+        return rows[~np.isin(rows, np.concatenate(excluded))]
+
+    def _blend(self, rows, seed_row, user_row):
+        # Stage 2: each signal scaled to [0, 1] over the candidates, then weighted
+        signals = {"popularity": self.popularity[rows]}
+        if seed_row is not None:
+            matrix = self.engine.tfidf_matrix
+            content = (matrix[rows] @ matrix[seed_row].T).toarray().ravel()
+            # Relative to the best candidate, so the weight means the same
+            # whatever the absolute cosine range of this seed
+            signals["content"] = content / content.max() if content.max() > 0 else content
+        if user_row is not None:
+            items = self.item_for_row[rows]
+            predicted = np.full(len(rows), self.collab.baseline(user_row))
+            known = items >= 0
+            predicted[known] = self.collab.predict_items(user_row, items[known])
+            low, high = self.collab.rating_scale
+            signals["collab"] = np.clip((predicted - low) / (high - low), 0.0, 1.0)
+        total = sum(self.weights[name] for name in signals) or 1.0
+        return sum(self.weights[name] / total * values for name, values in signals.items())
+
+    @timed("hybrid")
+    def rank(self, seed_row=None, user_id=None, top_n=10):
+        """(catalog rows, blended scores in [0, 1]) of the best `top_n` movies"""
+        user_row = self.collab.user_row(user_id) if self.collab is not None and user_id is not None else None
+        with span("hybrid_retrieve"):
+            rows = self._retrieve(seed_row, user_row)
+        if len(rows) == 0:
+            return rows, np.empty(0)
+        with span("hybrid_rerank"):
+            scores = self._blend(rows, seed_row, user_row)
+            top = top_k(scores, top_n)
+        return rows[top], scores[top]
+
+    def recommend(self, title=None, user_id=None, top_n=10):
+        """Recommendations DataFrame like RecommenderEngine.recommend, with the blended score as similarity"""
+        seed_row = self.engine.match_title(title) if title else None
+        rows, scores = self.rank(seed_row, user_id, top_n)
+        recommendations = self.engine.movies.frame(rows, RESULT_COLUMNS[:-1])
+        recommendations['similarity'] = np.round(scores * 100).astype(int)
+        return recommendations[RESULT_COLUMNS]
+
+# Shared ranker, rebuilt whenever the engine or the collaborative model changes
+_ranker = None
+
+def get_hybrid_ranker():
+    global _ranker
+    engine, collab = get_engine(), get_collab_model()
+    if _ranker is None or _ranker.engine is not engine or _ranker.collab is not collab:
+        _ranker = HybridRanker(engine, collab)
+    return _ranker
+
+def hybrid_job(title=None, user_id=None, top_n=10):
+    """
+    Worker pool entry point: (engine version, collaborative model version,
+    JSON response body)
+    """
+    ranker = get_hybrid_ranker()
+    recs = ranker.recommend(title, user_id, top_n)
+    with span("serialize"):
+        collab_version = ranker.collab.version if ranker.collab is not None else None
+        return ranker.engine.version, collab_version, ranker.engine.to_json(recs)
@@ -1,11 +1,216 @@
-from fastapi import FastAPI, Query
+import asyncio
+import hashlib
+import logging
+import os
+import time
+
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from typing import List, Dict, Any
-import json
+from fastapi.responses import FileResponse, PlainTextResponse, Response
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
+
+from .catalog import get_catalog
+from .collab import get_collab_model
+from .hybrid import hybrid_job
+from .metrics import REGISTRY, REQUEST_SECONDS, collect_spans, server_timing, span
+from .profiles import ProfileStore
+from .recommend_enhanced import batch_job, content_job, get_engine, profile_job
+from .reload import Reloader
+from .response_cache import ResponseCache
+from .serialization import dumps
+from .worker_pool import Overloaded, WorkerPool
+
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+)
+
+# Add a Server-Timing header with per-stage durations to every response
+SERVER_TIMING = os.getenv("SERVER_TIMING", "").lower() in ("1", "true", "yes")
+
+# Response cache sizing; see GET /cache/stats for the hit rate
+CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+CACHE_CONTROL = f"public, max-age={int(CACHE_TTL)}"
+# Per-user responses: never shared between users, and revalidated (cheaply,
+# through the ETag) on every use so a new rating shows up right away
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+# Serialized responses keyed by endpoint and movie id
+response_cache = ResponseCache(CACHE_MAX_ENTRIES, CACHE_TTL)
+# Normalized query title (see TitleMatcher.key) -> resolved catalog row, so
+# repeated fuzzy lookups are free however the title is cased or spaced
+title_cache = ResponseCache(CACHE_MAX_ENTRIES, CACHE_TTL)
+
+# Worker processes for title matching and scoring, so slow recommendation
+# requests don't hold up /suggest and /movie lookups
+recommend_pool = WorkerPool(initializer=get_engine)
+
+# Users' ratings and their cached content profiles
+profile_store = ProfileStore()
+
+# Rebuilds and swaps in the catalog and models when their files change
+reloader = Reloader(recommend_pool)
+
+class BatchRecommendRequest(BaseModel):
+    titles: List[str] = Field(..., min_length=1, max_length=100, description="Seed movie titles")
+    top_n: int = Field(6, ge=1, le=50, description="Recommendations per seed")
+    merged: bool = Field(False, description="Also return a merged \"more like these\" list")
+
+# A rating given by title is only recorded for a match at least this close
+# (RapidFuzz WRatio, 0-100): a typo still resolves, an unrelated title doesn't
+RATING_MATCH_SCORE = 85
+
+class RatingRequest(BaseModel):
+    movie_id: Optional[int] = Field(None, description="TMDb id of the rated movie")
+    title: Optional[str] = Field(None, description="Title of the rated movie, if no movie_id is given")
+    rating: float = Field(..., ge=0.5, le=5.0)
+
+# Response schemas, for the API docs. Recommendation endpoints return
+# JSON assembled from pre-serialized movie fragments (see
+# src/serialization.py), so these are not validated per request
+class Recommendation(BaseModel):
+    title: str
+    overview: Optional[str] = None
+    genres: List[str] = []
+    actors: List[str] = []
+    directors: List[str] = []
+    poster_url: Optional[str] = None
+    vote_average: Optional[float] = None
+    similarity: int = Field(..., description="Display similarity in percent")
+
+class CollabRecommendation(BaseModel):
+    movie_id: int = Field(..., description="MovieLens movie id")
+    title: str
+    predicted_rating: float
+
+class BatchResult(BaseModel):
+    title: str
+    matched_title: Optional[str] = None
+    recommendations: List[Recommendation]
+
+class BatchRecommendResponse(BaseModel):
+    results: List[BatchResult]
+    merged: Optional[List[Recommendation]] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Stamp the watched files first, so a change during startup still reloads
+    reloader.mark_loaded()
+    # Load the catalog and build the recommender once so requests don't
+    # re-read the JSON file or refit TF-IDF
+    get_catalog().suggest_index
+    get_catalog().facets
+    get_engine()
+    get_collab_model()
+    # Started after the engine so a missing artifact is built once, here,
+    # rather than by every worker
+    recommend_pool.start()
+    watcher = asyncio.create_task(reloader.watch()) if reloader.interval > 0 else None
+    yield
+    if watcher is not None:
+        watcher.cancel()
+    recommend_pool.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware("http")
+async def time_request(request: Request, call_next):
+    start = time.perf_counter()
+    with collect_spans() as spans:
+        response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    # Label by route template so /movie/{movie_id} stays one series
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(
+        elapsed, method=request.method, route=getattr(route, "path", "unmatched"), status=str(response.status_code),
+    )
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = server_timing(spans, elapsed)
+    return response
 
-app = FastAPI()
+def _cache_metrics():
+    # Scrape-time view of the caches and the worker pool for /metrics
+    stats = {"responses": response_cache.stats(), "titles": title_cache.stats()}
+    for field, kind, help in (
+        ("hits", "counter", "Cache lookups that found a live entry"),
+        ("misses", "counter", "Cache lookups that found nothing or an expired entry"),
+        ("evictions", "counter", "Entries evicted to stay within the size limit"),
+        ("expirations", "counter", "Entries dropped after their TTL"),
+        ("invalidations", "counter", "Times the whole cache was dropped for a new catalog/model version"),
+    ):
+        yield (f"response_cache_{field}_total", kind, help, ("cache",),
+               [((name,), cache[field]) for name, cache in stats.items()])
+    yield ("response_cache_entries", "gauge", "Entries currently cached", ("cache",),
+           [((name,), cache["size"]) for name, cache in stats.items()])
+    yield ("response_cache_hit_ratio", "gauge", "Hits over lookups since start", ("cache",),
+           [((name,), cache["hit_rate"]) for name, cache in stats.items()])
+
+    pool = recommend_pool.stats()
+    yield ("recommend_pool_workers", "gauge", "Recommendation worker processes", (), [((), pool["workers"])])
+    yield ("recommend_pool_pending", "gauge", "Recommendation calls queued or running", (), [((), pool["pending"])])
+    yield ("recommend_pool_rejected_total", "counter", "Recommendation calls refused with 503", (),
+           [((), pool["rejected"])])
+
+REGISTRY.add_collector(_cache_metrics)
+
+def _cache_version():
+    # Cached entries are only valid for the catalog and models they came from
+    collab = get_collab_model()
+    return get_catalog().source_hash, get_engine().version, collab.version if collab is not None else None
+
+def _cached(request, key, version, private=False):
+    """The cached response for `key`, or None on a miss"""
+    entry = response_cache.get(key, version)
+    return None if entry is None else _respond(request, entry, private)
+
+def _store(request, key, version, data, private=False):
+    """Serialize `data`, cache it under `key` and respond with it"""
+    with span("serialize"):
+        body = dumps(data)
+    return _store_body(request, key, version, body, private)
+
+def _store_body(request, key, version, body, private=False):
+    """Cache an already serialized JSON `body` under `key` and respond with it"""
+    etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+    return _respond(request, response_cache.put(key, version, (body, etag)), private)
+
+def _cached_response(request, key, version, build):
+    """Serve `key` from the cache, building and storing it on a miss"""
+    response = _cached(request, key, version)
+    if response is None:
+        response = _store(request, key, version, build())
+    return response
+
+def _respond(request, entry, private=False):
+    # ETag/Cache-Control headers, and a 304 for a matching If-None-Match.
+    # `private` responses depend on the user and must not be shared.
+    body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": PRIVATE_CACHE_CONTROL if private else CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match", "")
+    if any(tag.strip().removeprefix("W/") in (etag, "*") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+def _filters(genre, year_min, year_max, min_rating):
+    """FacetIndex.mask arguments for the filters a request set"""
+    filters = {"genres": genre, "year_min": year_min, "year_max": year_max, "min_rating": min_rating}
+    return {name: value for name, value in filters.items() if value}
+
+def _filters_key(filters):
+    # Hashable form of the filters, for cache keys
+    return tuple((name, tuple(value) if isinstance(value, list) else value) for name, value in sorted(filters.items()))
+
+async def _run_recommend(fn, *args):
+    try:
+        # Includes the time spent waiting for a free worker
+        with span("recommend_pool"):
+            return await recommend_pool.run(fn, *args)
+    except Overloaded:
+        raise HTTPException(503, "Too many recommendation requests, try again shortly", headers={"Retry-After": "1"})
 
 # Enable CORS
 app.add_middleware(
@@ -23,36 +228,163 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 def root():
     return FileResponse("static/index.html")
 
-def load_tmdb_data():
-    """Load movie data from TMDb JSON file"""
-    with open("data/tmdb_movies.json", "r", encoding="utf-8") as f:
-        movies = json.load(f)
-    return movies
+@app.get("/recommend/content", response_model=List[Recommendation])
+async def recommend_by_content(
+    request: Request,
+    title: str = Query(..., description="Movie title to base recommendations on"),
+    genre: Optional[List[str]] = Query(None, description="Only movies with every one of these genres"),
+    year_min: Optional[int] = Query(None, description="Earliest release year"),
+    year_max: Optional[int] = Query(None, description="Latest release year"),
+    min_rating: Optional[float] = Query(None, ge=0, le=10, description="Minimum vote average"),
+):
+    engine = get_engine()
+    version = _cache_version()
+    filters = _filters(genre, year_min, year_max, min_rating)
+    title_key = engine.title_matcher.key(title)
+    row = title_cache.get(title_key, version)
+    if row is not None:
+        # Every spelling that resolves to the same movie shares one cached response
+        response = _cached(request, ("content", int(engine.movie_ids[row]), _filters_key(filters)), version)
+        if response is not None:
+            return response
+
+    worker_version, row, body = await _run_recommend(content_job, title, row, filters)
+    if worker_version != engine.version:
+        # A worker still on another model; don't cache what it produced
+        return Response(body, media_type="application/json")
+    title_cache.put(title_key, version, row)
+    movie_id = int(engine.movie_ids[row]) if row is not None else None
+    return _store_body(request, ("content", movie_id, _filters_key(filters)), version, body)
+
+@app.post("/recommend/batch", response_model=BatchRecommendResponse)
+async def recommend_batch(request: BatchRecommendRequest):
+    body = await _run_recommend(batch_job, request.titles, request.top_n, request.merged)
+    return Response(body, media_type="application/json")
+
+@app.get("/recommend/hybrid", response_model=List[Recommendation])
+async def recommend_hybrid(
+    request: Request,
+    title: Optional[str] = Query(None, description="Seed movie title"),
+    user_id: Optional[str] = Query(None, description="User whose ratings to blend in"),
+    top_n: int = Query(6, ge=1, le=50, description="Number of recommendations"),
+):
+    # `similarity` is the blended content/collaborative/popularity score
+    if not title and user_id is None:
+        raise HTTPException(400, "Give a title, a user_id or both")
+    key, version = ("hybrid", title, user_id, top_n), _cache_version()
+    private = user_id is not None
+    response = _cached(request, key, version, private)
+    if response is not None:
+        return response
+    engine_version, collab_version, body = await _run_recommend(hybrid_job, title, user_id, top_n)
+    if (engine_version, collab_version) != version[1:]:
+        # A worker still on other models; don't cache what it produced
+        return Response(body, media_type="application/json")
+    return _store_body(request, key, version, body, private)
+
+@app.post("/profile/{user_id}/ratings", response_model=Dict[str, Any])
+def add_rating(user_id: str, rating: RatingRequest):
+    """Record a rating; the user's profile is updated in place rather than rebuilt"""
+    engine = get_engine()
+    if rating.movie_id is not None:
+        row = engine.movies.row(rating.movie_id)
+        if row is None:
+            raise HTTPException(404, "Movie not found")
+    elif rating.title:
+        row = engine.match_title(rating.title, RATING_MATCH_SCORE)
+        if row is None:
+            raise HTTPException(404, f"No movie closely matches {rating.title!r}; give its movie_id")
+    else:
+        raise HTTPException(400, "Give a movie_id or a title")
+    movie_id = int(engine.movie_ids[row])
+    count = profile_store.rate(user_id, movie_id, rating.rating, engine)
+    return {"user_id": user_id, "movie_id": movie_id, "title": engine.movie_titles[row], "ratings": count}
 
-@app.get("/recommend/content", response_model=List[Dict[str, Any]])
-def recommend_by_content(title: str = Query(..., description="Movie title to base recommendations on")):
-    from .recommend_enhanced import hybrid_recommend_movies
-    recs = hybrid_recommend_movies(title)
-    # Convert DataFrame to list of dicts for response
-    return recs.to_dict(orient="records")
+@app.get("/recommend/profile", response_model=List[Recommendation])
+async def recommend_profile(
+    request: Request,
+    user_id: str = Query(..., description="User whose ratings make up the profile"),
+    top_n: int = Query(6, ge=1, le=50, description="Number of recommendations"),
+):
+    # Movies closest to the rating-weighted sum of the user's rated movies,
+    # scored with one sparse product; rated movies are left out
+    engine = get_engine()
+    # Off the event loop: the first call loads and replays the ratings, and
+    # the store's lock is shared with add_rating
+    snapshot = await asyncio.to_thread(profile_store.snapshot, user_id, engine)
+    if snapshot is None:
+        raise HTTPException(404, f"No ratings for user {user_id}")
+    vector, rated_rows, revision = snapshot
+    key, version = ("profile", user_id, revision, top_n), _cache_version()
+    response = _cached(request, key, version, private=True)
+    if response is not None:
+        return response
+    _, body = await _run_recommend(profile_job, vector, rated_rows, top_n, engine.version)
+    if body is None:
+        # A worker still on another model; score here against the one the profile was built for
+        body = await asyncio.to_thread(lambda: engine.to_json(engine.recommend_vector(vector, rated_rows, top_n)))
+        return Response(body, media_type="application/json")
+    return _store_body(request, key, version, body, private=True)
+
+@app.get("/recommend/collab", response_model=List[CollabRecommendation])
+def recommend_collab(
+    request: Request,
+    user_id: str = Query(..., description="User whose unseen movies to rank"),
+    top_n: int = Query(10, ge=1, le=100, description="Number of recommendations"),
+):
+    # One matrix-vector product over the item factors, cheap enough for
+    # the request thread rather than the worker pool
+    collab = get_collab_model()
+    if collab is None:
+        raise HTTPException(503, "Collaborative model not trained; run python -m src.generate_collab_recs --train")
+    key, version = ("collab", user_id, top_n), _cache_version()
+    response = _cached(request, key, version, private=True)
+    if response is not None:
+        return response
+    recs = collab.recommend(user_id, top_n)
+    if recs is None:
+        raise HTTPException(404, f"Unknown user {user_id}")
+    return _store(request, key, version, recs, private=True)
 
 @app.get("/suggest", response_model=List[str])
-def suggest_titles(q: str = Query(..., description="Partial movie title for suggestions")):
-    movies = load_tmdb_data()
-    # Filter movies where title contains query (case insensitive)
-    suggestions = []
-    for movie in movies:
-        if q.lower() in movie['title'].lower():
-            suggestions.append(movie['title'])
-        if len(suggestions) >= 10:
-            break
-    return suggestions
+async def suggest_titles(
+    q: str = Query(..., description="Partial movie title for suggestions"),
+    limit: int = Query(10, ge=1, le=50, description="Maximum number of suggestions"),
+    genre: Optional[List[str]] = Query(None, description="Only movies with every one of these genres"),
+    year_min: Optional[int] = Query(None, description="Earliest release year"),
+    year_max: Optional[int] = Query(None, description="Latest release year"),
+    min_rating: Optional[float] = Query(None, ge=0, le=10, description="Minimum vote average"),
+):
+    # Ranked prefix / word / infix matches, see src/suggest_index.py. A
+    # sub-millisecond in-memory lookup, so it runs on the event loop and
+    # never queues behind recommendation work
+    return get_catalog().suggest(q, limit=limit, **_filters(genre, year_min, year_max, min_rating))
 
 # TMDb data already has detailed information, so we can add a new endpoint
 @app.get("/movie/{movie_id}", response_model=Dict[str, Any])
-def get_movie_details(movie_id: int):
-    movies = load_tmdb_data()
-    for movie in movies:
-        if movie['id'] == movie_id:
-            return movie
-    return {"error": "Movie not found"}
+def get_movie_details(request: Request, movie_id: int):
+    def build():
+        movie = get_catalog().get(movie_id)
+        if movie is None:
+            return {"error": "Movie not found"}
+        return movie
+    return _cached_response(request, ("movie", movie_id), _cache_version(), build)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus metrics: stage and request latency histograms, cache and pool counters"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/status", response_model=Dict[str, Any])
+def status():
+    """Active catalog and model versions, and the state of the hot reloader"""
+    return reloader.status()
+
+@app.get("/cache/stats", response_model=Dict[str, Any])
+def cache_stats():
+    """Hit/miss counters of the response and title caches"""
+    return {
+        "responses": response_cache.stats(),
+        "titles": title_cache.stats(),
+        "recommend_pool": recommend_pool.stats(),
+    }
@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+from scipy import sparse
+
+# Bump whenever the feature pipeline changes so stale artifacts are rebuilt
+ARTIFACT_VERSION = 2
+
+MODEL_DIR = "data/model"
+
+def artifact_key(source_hash):
+    """Directory name for the artifact built from a given catalog hash"""
+    return f"v{ARTIFACT_VERSION}-{source_hash[:16]}"
+
+def save_model(source_hash, features, tfidf_matrix, titles, model_dir=MODEL_DIR,
+               patched_rows=0, finish=None, replace=False):
+    """
+    Write the fitted per-field vocabularies/IDFs (see FeaturePipeline.state),
+    the CSR matrix and the title index into
+    a versioned artifact directory. The directory is populated under a temp
+    name and renamed into place, so readers never see a partial artifact;
+    `finish` is called with the temp directory first to add derived files
+    (the neighbor table or ANN index) before it's published.
+    `patched_rows` counts the rows re-vectorized in place since the last
+    full fit (see update_model). `replace` swaps out an existing artifact
+    for the same catalog, e.g. when refitting a patched one.
+    """
+    key = artifact_key(source_hash)
+    final_dir = os.path.join(model_dir, key)
+    tmp_dir = os.path.join(model_dir, f".{key}.tmp{os.getpid()}")
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    tfidf_matrix = sparse.csr_matrix(tfidf_matrix)
+    # Raw CSR arrays rather than a compressed npz so they can be memory-mapped
+    np.save(os.path.join(tmp_dir, "tfidf_data.npy"), tfidf_matrix.data.astype(np.float64))
+    np.save(os.path.join(tmp_dir, "tfidf_indices.npy"), tfidf_matrix.indices.astype(np.int32))
+    np.save(os.path.join(tmp_dir, "tfidf_indptr.npy"), tfidf_matrix.indptr.astype(np.int64))
+    vocabularies, idfs = features.state()
+    for field in vocabularies:
+        np.save(os.path.join(tmp_dir, f"idf_{field}.npy"), idfs[field])
+        with open(os.path.join(tmp_dir, f"vocabulary_{field}.json"), "w", encoding="utf-8") as f:
+            json.dump(vocabularies[field], f, ensure_ascii=False)
+    with open(os.path.join(tmp_dir, "titles.json"), "w", encoding="utf-8") as f:
+        json.dump(list(titles), f, ensure_ascii=False)
+
+    manifest = {
+        "artifact_version": ARTIFACT_VERSION,
+        "source_hash": source_hash,
+        "shape": list(tfidf_matrix.shape),
+        "field_weights": features.weights,
+        "patched_rows": int(patched_rows),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    if finish is not None:
+        finish(tmp_dir)
+
+    if replace:
+        # Readers keep their memory maps of the old files
+        old_dir = os.path.join(model_dir, f".{key}.old{os.getpid()}")
+        try:
+            os.rename(final_dir, old_dir)
+        except OSError:
+            pass
+        shutil.rmtree(old_dir, ignore_errors=True)
+    try:
+        os.rename(tmp_dir, final_dir)
+    except OSError:
+        # Another worker published the same version first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    prune_models(model_dir, keep=key)
+    return final_dir
+
+def load_model(source_hash, model_dir=MODEL_DIR):
+    """
+    Load the artifact built from the given catalog hash, or return None if it
+    doesn't exist. The CSR arrays are memory-mapped so workers share pages.
+    """
+    return _load_artifact(os.path.join(model_dir, artifact_key(source_hash)), source_hash)
+
+def load_latest_model(model_dir=MODEL_DIR):
+    """Load the most recently built compatible artifact, whatever catalog it came from"""
+    if not os.path.isdir(model_dir):
+        return None
+    candidates = [
+        os.path.join(model_dir, name) for name in os.listdir(model_dir)
+        if name.startswith(f"v{ARTIFACT_VERSION}-")
+    ]
+    for path in sorted(candidates, key=os.path.getmtime, reverse=True):
+        model = _load_artifact(path)
+        if model is not None:
+            return model
+    return None
+
+def _load_artifact(path, source_hash=None):
+    try:
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("artifact_version") != ARTIFACT_VERSION:
+        return None
+    if source_hash is not None and manifest.get("source_hash") != source_hash:
+        return None
+
+    tfidf_matrix = load_csr(path, tuple(manifest["shape"]))
+
+    vocabularies, idfs = {}, {}
+    for field in manifest["field_weights"]:
+        with open(os.path.join(path, f"vocabulary_{field}.json"), "r", encoding="utf-8") as f:
+            vocabularies[field] = json.load(f)
+        idfs[field] = np.load(os.path.join(path, f"idf_{field}.npy"))
+
+    with open(os.path.join(path, "titles.json"), "r", encoding="utf-8") as f:
+        titles = json.load(f)
+
+    return {
+        "manifest": manifest,
+        "vocabularies": vocabularies,
+        "idfs": idfs,
+        "tfidf_matrix": tfidf_matrix,
+        "titles": titles,
+        "path": path,
+    }
+
+def load_csr(path, shape=None):
+    """Memory-map the CSR matrix stored in an artifact directory"""
+    if shape is None:
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            shape = tuple(json.load(f)["shape"])
+    data = np.load(os.path.join(path, "tfidf_data.npy"), mmap_mode="r")
+    indices = np.load(os.path.join(path, "tfidf_indices.npy"), mmap_mode="r")
+    indptr = np.load(os.path.join(path, "tfidf_indptr.npy"), mmap_mode="r")
+    return sparse.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+
+def save_array(path, array):
+    """np.save `array` to `path` through a rename, so readers never see a partial file"""
+    tmp_path = f"{path}.tmp{os.getpid()}.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+def prune_models(model_dir=MODEL_DIR, keep=None):
+    """Remove artifact versions other than `keep`"""
+    for name in os.listdir(model_dir):
+        if name != keep and not name.startswith("."):
+            shutil.rmtree(os.path.join(model_dir, name), ignore_errors=True)
@@ -0,0 +1,218 @@
+import math
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# List columns that share one vocabulary: most directors also appear as
+# actors somewhere in the catalog
+SHARED_VOCABULARIES = {"actors": "people", "directors": "people"}
+
+def _text(column):
+    # (UTF-8 bytes, int64 offsets into them, null mask or None) of a string column
+    array = column.combine_chunks().cast(pa.large_string())
+    offsets = np.frombuffer(array.buffers()[1], dtype=np.int64)[array.offset:array.offset + len(array) + 1]
+    data = array.buffers()[2]
+    data = b"" if data is None else data.to_pybytes()[offsets[0]:offsets[-1]]
+    nulls = array.is_null().to_numpy(zero_copy_only=False) if array.null_count else None
+    return data, offsets - offsets[0], nulls
+
+def _names(column):
+    # (int64 offsets, flattened name strings) of a list-of-strings column
+    lists = column.combine_chunks()
+    lengths = pc.list_value_length(lists).fill_null(0).to_numpy(zero_copy_only=False)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    flat = pc.list_flatten(lists)
+    if pa.types.is_dictionary(flat.type):
+        flat = flat.dictionary_decode()
+    return offsets, flat.cast(pa.string()).fill_null("")
+
+class MovieView(Mapping):
+    """Read-only mapping over one movie of a MovieTable; fields are decoded on access"""
+
+    __slots__ = ("table", "row")
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, name):
+        if name not in self.table.kinds:
+            raise KeyError(name)
+        return self.table.value(name, self.row)
+
+    def __iter__(self):
+        return iter(self.table.columns)
+
+    def __len__(self):
+        return len(self.table.columns)
+
+class TextColumn(Sequence):
+    """Read-only sequence over one text column of a MovieTable; values are decoded on access"""
+
+    __slots__ = ("table", "name")
+
+    def __init__(self, table, name):
+        self.table = table
+        self.name = name
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self.table.value(self.name, i) for i in range(*row.indices(len(self)))]
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return self.table.value(self.name, row)
+
+    def __len__(self):
+        return self.table.size
+
+class MovieTable:
+    """
+    The catalog in a few flat arrays instead of per-movie Python objects.
+    Text columns (title, overview, poster URL, release date) live in one
+    contiguous UTF-8 buffer with an offset array per column; genres and
+    people are interned into integer ids, each movie's list being a slice
+    of a CSR-style codes array, so a name is stored once however many
+    movies it appears in. Values are only turned into Python objects when
+    a movie is read: movie() views and record() for one movie, frame()
+    for the few rows of a result, and lazy sequences such as `titles` for
+    the title indexes. A table can start with a few columns and be
+    extended with the rest when they are first needed.
+    """
+
+    def __init__(self, table):
+        self.columns = []
+        self.size = table.num_rows
+        # Column -> "text", "names" or "number"
+        self.kinds = {}
+        # Text column -> (offsets, null mask or None), into self.text
+        self.offsets = {}
+        self.text = b""
+        # Name list column -> (offsets, codes into its vocabulary, vocabulary name)
+        self.lists = {}
+        self.vocabularies = {}
+        # Numeric column -> array
+        self.numbers = {}
+        # (ids in sorted order, their rows), built on first id lookup
+        self._id_index = None
+        self.extend(table)
+
+    def extend(self, table):
+        """
+        Add the columns of `table` (the same movies, in the same order)
+        that aren't loaded yet, and take on its column order
+        """
+        if table.num_rows != self.size:
+            raise ValueError(f"expected {self.size} rows, got {table.num_rows}")
+        chunks, start = [], len(self.text)
+        flats = {}
+        for name in table.column_names:
+            if name in self.kinds:
+                continue
+            column = table.column(name)
+            if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+                data, offsets, nulls = _text(column)
+                self.offsets[name] = (offsets + start, nulls)
+                chunks.append(data)
+                start += len(data)
+                self.kinds[name] = "text"
+            elif pa.types.is_list(column.type) or pa.types.is_large_list(column.type):
+                flats[name] = _names(column)
+                self.kinds[name] = "names"
+            else:
+                self.numbers[name] = column.to_numpy()
+                self.kinds[name] = "number"
+        # Appended, so the offsets of columns already loaded stay valid
+        self.text += b"".join(chunks)
+
+        # Intern the names of each vocabulary: one dictionary over all its columns
+        groups = {}
+        for name in flats:
+            groups.setdefault(SHARED_VOCABULARIES.get(name, name), []).append(name)
+        for vocabulary, names in groups.items():
+            encoded = pa.concat_arrays([flats[name][1] for name in names]).dictionary_encode()
+            codes = encoded.indices.to_numpy(zero_copy_only=False).astype(np.int32)
+            self.vocabularies[vocabulary] = encoded.dictionary.to_pylist()
+            position = 0
+            for name in names:
+                offsets, flat = flats[name]
+                self.lists[name] = (offsets, codes[position:position + len(flat)], vocabulary)
+                position += len(flat)
+        self.columns = list(table.column_names) + [name for name in self.columns if name not in table.column_names]
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def ids(self):
+        return self.numbers["id"]
+
+    @property
+    def titles(self):
+        """Lazy sequence of the titles, shared by the catalog, the engine and their indexes"""
+        return TextColumn(self, "title")
+
+    def rows(self, movie_ids):
+        """Row of each of `movie_ids` (the first one for a repeated id), -1 where unknown"""
+        if self._id_index is None:
+            order = np.argsort(self.ids, kind="stable")
+            self._id_index = (self.ids[order], order)
+        sorted_ids, order = self._id_index
+        movie_ids = np.asarray(movie_ids)
+        if not len(sorted_ids):
+            return np.full(movie_ids.shape, -1, dtype=np.int64)
+        positions = np.searchsorted(sorted_ids, movie_ids).clip(max=len(sorted_ids) - 1)
+        return np.where(sorted_ids[positions] == movie_ids, order[positions], -1)
+
+    def row(self, movie_id):
+        """Row of the movie with the given TMDb id, or None"""
+        row = int(self.rows(movie_id))
+        return None if row < 0 else row
+
+    def value(self, name, row):
+        """Python value of one field: str or None, list of names, or number (None when missing)"""
+        kind = self.kinds[name]
+        if kind == "text":
+            offsets, nulls = self.offsets[name]
+            if nulls is not None and nulls[row]:
+                return None
+            return self.text[offsets[row]:offsets[row + 1]].decode("utf-8")
+        if kind == "names":
+            offsets, codes, vocabulary = self.lists[name]
+            names = self.vocabularies[vocabulary]
+            return [names[code] for code in codes[offsets[row]:offsets[row + 1]].tolist()]
+        value = self.numbers[name][row].item()
+        if isinstance(value, float) and math.isnan(value):
+            return None
+        return value
+
+    def movie(self, row):
+        """Lazy MovieView of one row"""
+        return MovieView(self, row)
+
+    def record(self, row, columns=None):
+        """Dict of one movie's fields, all of them unless `columns` is given"""
+        return {name: self.value(name, row) for name in (self.columns if columns is None else columns)}
+
+    def column(self, name, rows=None):
+        """
+        Values of one column for `rows` (default all): an array for numeric
+        columns, a list otherwise
+        """
+        if self.kinds[name] == "number":
+            values = self.numbers[name]
+            return values if rows is None else values[rows]
+        rows = range(self.size) if rows is None else np.asarray(rows).tolist()
+        return [self.value(name, row) for row in rows]
+
+    def frame(self, rows=None, columns=None):
+        """DataFrame of `rows` (default all), indexed by row"""
+        index = np.arange(self.size) if rows is None else np.asarray(rows, dtype=np.int64)
+        columns = self.columns if columns is None else columns
+        return pd.DataFrame({name: self.column(name, index) for name in columns}, index=index, columns=columns)
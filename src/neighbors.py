@@ -0,0 +1,127 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .model_store import load_csr, save_array
+
+# Number of neighbors kept per movie (the table also keeps the movie itself)
+NEIGHBOR_K = 50
+
+# Upper bound on dense cells materialized per block of rows
+BLOCK_CELLS = 20_000_000
+
+# Processes computing blocks in parallel; each holds a dense block of up to
+# BLOCK_CELLS float64 cells, so like RECOMMEND_WORKERS this stays small by default
+NEIGHBOR_WORKERS = int(os.getenv("NEIGHBOR_WORKERS", str(min(os.cpu_count() or 1, 2))))
+
+# Per-process state for the pool workers
+_matrix = None
+_norms = None
+
+def _row_norms(matrix):
+    return np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+
+def _init_worker(model_path):
+    global _matrix, _norms
+    # Each worker memory-maps the same artifact instead of receiving a copy
+    _matrix = load_csr(model_path)
+    _norms = _row_norms(_matrix)
+
+def _block_size():
+    return max(1, BLOCK_CELLS // max(_matrix.shape[0], 1))
+
+def _cosine_rows(rows):
+    """Dense cosine similarities of the given rows against every row"""
+    sims = (_matrix[rows] @ _matrix.T).toarray()
+    denom = np.outer(_norms[rows], _norms)
+    np.divide(sims, denom, out=sims, where=denom > 0)
+    return sims
+
+def _top_k_rows(rows, width):
+    """Top `width` cosine neighbors for the given rows of the matrix"""
+    sims = _cosine_rows(rows)
+
+    # argpartition then sort only the kept columns
+    top = np.argpartition(-sims, width - 1, axis=1)[:, :width]
+    top_scores = np.take_along_axis(sims, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    return rows, top.astype(np.int32), top_scores.astype(np.float32)
+
+def _compute_rows(model_path, rows, width, workers=None):
+    """Yield (rows, indices, scores) for `rows` in blocks, on a process pool when worthwhile"""
+    block = _block_size()
+    blocks = [rows[start:start + block] for start in range(0, len(rows), block)]
+
+    workers = workers or NEIGHBOR_WORKERS
+    if workers == 1 or len(blocks) <= 1:
+        for block_rows in blocks:
+            yield _top_k_rows(block_rows, width)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+        futures = [pool.submit(_top_k_rows, block_rows, width) for block_rows in blocks]
+        for future in futures:
+            yield future.result()
+
+def build_neighbor_table(model_path, k=NEIGHBOR_K, workers=None):
+    """
+    Compute the top-k cosine neighbors of every movie with blocked sparse
+    matrix products spread over a process pool, and store them next to the
+    model artifact as int32 indices and float32 scores indexed by movie row.
+    """
+    _init_worker(model_path)
+    n_rows = _matrix.shape[0]
+    width = min(k + 1, n_rows)
+
+    indices = np.zeros((n_rows, width), dtype=np.int32)
+    scores = np.zeros((n_rows, width), dtype=np.float32)
+    for rows, top, top_scores in _compute_rows(model_path, np.arange(n_rows), width, workers):
+        indices[rows] = top
+        scores[rows] = top_scores
+
+    save_array(os.path.join(model_path, "neighbor_indices.npy"), indices)
+    save_array(os.path.join(model_path, "neighbor_scores.npy"), scores)
+    return indices, scores
+
+def update_neighbor_table(model_path, old_indices, old_scores, changed_rows, workers=None):
+    """
+    Update a neighbor table after the feature rows in `changed_rows` were
+    replaced, recomputing only the rows whose top-k could have changed:
+    the changed rows themselves, rows that listed a changed movie, and rows
+    a changed movie is now similar enough to enter.
+    """
+    _init_worker(model_path)
+    n_rows = _matrix.shape[0]
+    width = old_indices.shape[1]
+    changed_rows = np.asarray(changed_rows, dtype=np.intp)
+
+    affected = np.zeros(n_rows, dtype=bool)
+    affected[changed_rows] = True
+    affected |= np.isin(old_indices, changed_rows).any(axis=1)
+    block = _block_size()
+    for start in range(0, len(changed_rows), block):
+        sims = _cosine_rows(changed_rows[start:start + block])
+        affected |= sims.max(axis=0) > old_scores[:, -1]
+
+    indices = np.array(old_indices, dtype=np.int32)
+    scores = np.array(old_scores, dtype=np.float32)
+    for rows, top, top_scores in _compute_rows(model_path, np.flatnonzero(affected), width, workers):
+        indices[rows] = top
+        scores[rows] = top_scores
+
+    save_array(os.path.join(model_path, "neighbor_indices.npy"), indices)
+    save_array(os.path.join(model_path, "neighbor_scores.npy"), scores)
+    return indices, scores, int(affected.sum())
+
+def load_neighbor_table(model_path):
+    """Memory-map the neighbor table of an artifact, or return None if it hasn't been built"""
+    try:
+        indices = np.load(os.path.join(model_path, "neighbor_indices.npy"), mmap_mode="r")
+        scores = np.load(os.path.join(model_path, "neighbor_scores.npy"), mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if indices.shape != scores.shape:
+        return None
+    return indices, scores
@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+# Every rating received through the API, one JSON object per line
+PROFILE_RATINGS = "data/user_ratings.jsonl"
+# Your own ratings (title, rating): the starting profile of PERSONAL_USER_ID
+# here, and that user's ratings when training the collaborative model
+PERSONAL_RATINGS = "data/ratings.csv"
+PERSONAL_USER_ID = 0
+
+# Ratings above this pull a profile towards a movie's terms, ratings
+# below it push away from them
+RATING_CENTER = 2.5
+
+def _weight(rating):
+    return rating - RATING_CENTER
+
+class UserProfile:
+    """
+    One user's ratings and their rating-weighted sum of TF-IDF rows, valid
+    for the engine version it was built against. A new or changed rating
+    adds that movie's row times the change in weight, so keeping the
+    profile current costs one sparse row per rating.
+    """
+
+    def __init__(self):
+        # movie id -> rating
+        self.ratings = {}
+        # Bumped on every rating, so cached responses for older states are skipped
+        self.revision = 0
+        self.version = None
+        self.vector = None
+        # movie id -> engine row, of the rated movies the engine knows
+        self.rows = {}
+
+    def build(self, engine):
+        """Recompute the vector from all ratings against `engine`"""
+        movie_ids = list(self.ratings)
+        self.rows = {
+            movie_id: int(row) for movie_id, row in zip(movie_ids, engine.movies.rows(movie_ids)) if row >= 0
+        }
+        matrix = engine.tfidf_matrix
+        if self.rows:
+            weights = sparse.csr_matrix(np.array([[_weight(self.ratings[movie_id]) for movie_id in self.rows]]))
+            self.vector = sparse.csr_matrix(weights @ matrix[list(self.rows.values())])
+        else:
+            self.vector = sparse.csr_matrix((1, matrix.shape[1]))
+        self.version = engine.version
+
+    def rate(self, movie_id, rating, engine):
+        """Add or change one rating"""
+        previous = self.ratings.get(movie_id)
+        self.ratings[movie_id] = rating
+        self.revision += 1
+        if self.version != engine.version:
+            self.build(engine)
+            return
+        row = engine.movies.row(movie_id)
+        if row is None:
+            return
+        delta = _weight(rating) - (_weight(previous) if previous is not None else 0.0)
+        self.vector = sparse.csr_matrix(self.vector + delta * engine.tfidf_matrix[row])
+        self.rows[movie_id] = row
+
+class ProfileStore:
+    """
+    Ratings of every user, appended to a JSON Lines log and replayed on
+    first use, with each user's profile vector kept in memory and updated
+    incrementally. The personal ratings CSV seeds PERSONAL_USER_ID.
+    """
+
+    def __init__(self, path=PROFILE_RATINGS, personal_path=PERSONAL_RATINGS):
+        self.path = path
+        self.personal_path = personal_path
+        self.profiles = None
+        self._lock = threading.Lock()
+
+    def _load(self, engine):
+        self.profiles = {}
+        try:
+            personal = pd.read_csv(self.personal_path)
+        except FileNotFoundError:
+            personal = None
+        if personal is not None:
+            for title, rating in zip(personal['title'], personal['rating']):
+                row = engine.match_title(title)
+                if row is not None:
+                    self._profile(str(PERSONAL_USER_ID)).rate(int(engine.movie_ids[row]), float(rating), engine)
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line_number, line in enumerate(f, 1):
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        logger.warning("Skipping unreadable line %d in %s", line_number, self.path)
+                        continue
+                    self._profile(entry["user_id"]).rate(entry["movie_id"], entry["rating"], engine)
+
+    def _profile(self, user_id):
+        profile = self.profiles.get(user_id)
+        if profile is None:
+            profile = self.profiles[user_id] = UserProfile()
+        return profile
+
+    def _append(self, entry):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def rate(self, user_id, movie_id, rating, engine):
+        """Record a rating and fold it into the user's profile; returns the number of ratings"""
+        with self._lock:
+            if self.profiles is None:
+                self._load(engine)
+            self._append({"user_id": user_id, "movie_id": movie_id, "rating": rating})
+            profile = self._profile(user_id)
+            profile.rate(movie_id, rating, engine)
+            return len(profile.ratings)
+
+    def snapshot(self, user_id, engine):
+        """
+        (profile vector, rated rows, revision) of a user against `engine`,
+        or None if the user has rated nothing
+        """
+        with self._lock:
+            if self.profiles is None:
+                self._load(engine)
+            profile = self.profiles.get(user_id)
+            if profile is None or not profile.ratings:
+                return None
+            if profile.version != engine.version:
+                # The model was reloaded; row ids and vocabulary changed
+                profile.build(engine)
+            return profile.vector, list(profile.rows.values()), profile.revision
@@ -1,20 +1,42 @@
+import logging
+import os
+
 import pandas as pd
-import json
 import numpy as np
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from rapidfuzz import process
-import re
+
+from .ann import ANN_NPROBE, ANN_RERANK, build_ann_index, load_ann_index
+from .catalog import CATALOG_PATH, get_catalog, load_catalog
+from .features import FeaturePipeline, extract_franchise_name
+from .metrics import span, timed
+from .model_store import MODEL_DIR, load_latest_model, load_model, save_model
+from .neighbors import build_neighbor_table, load_neighbor_table, update_neighbor_table
+from .scoring import inverted_index, sparse_top_k, top_k
+from .serialization import MovieFragments, dumps
+from .storage import read_catalog
+from .title_matcher import TitleMatcher
+
+logger = logging.getLogger(__name__)
+
+# "exact" uses the precomputed neighbor table, "ann" the IVF index over
+# LSA embeddings (src/ann.py) for catalogs too large for the table
+RECOMMENDER_INDEX = os.getenv("RECOMMENDER_INDEX", "exact")
+
+# Share of the catalog that may be re-vectorized in place (against the
+# vocabularies and IDFs of the last full fit) before the model is refit
+MODEL_PATCH_LIMIT = float(os.getenv("MODEL_PATCH_LIMIT", "0.05"))
+
+# Columns returned for each recommendation
+RESULT_COLUMNS = ['title', 'overview', 'genres', 'actors', 'directors', 'poster_url', 'vote_average', 'similarity']
 
 def normalize_title(title):
     # No need to handle articless like with MovieLens, TMDb titles are already normalized
     return title
 
-def load_tmdb_data():
-    """Load movie data from TMDb JSON file"""
-    with open("data/tmdb_movies.json", "r", encoding="utf-8") as f:
-        movies = json.load(f)
-    return pd.DataFrame(movies)
+def load_tmdb_data(path=CATALOG_PATH):
+    """Load movie data from the catalog storage"""
+    return pd.DataFrame(read_catalog(path))
 
 def recommend_movies(input_title, top_n=6):
     """Content-based recommendation using movie metadata"""
@@ -33,32 +55,29 @@ def recommend_movies(input_title, top_n=6):
     tfidf = TfidfVectorizer(stop_words='english')
     tfidf_matrix = tfidf.fit_transform(movies_df['features'])
     
-    # Use fuzzy matching to find closest title match
+    # Hash lookups, then trigram-blocked fuzzy matching (same as the engine)
     movie_titles = movies_df['title'].tolist()
-    match = process.extractOne(input_title, movie_titles)
-    if not match:
+    matched_idx = TitleMatcher(movie_titles).match(input_title)
+    if matched_idx is None:
         return pd.DataFrame({'title': [], 'overview': []})
     
-    matched_title = match[0]
-    matched_idx = movies_df[movies_df['title'] == matched_title].index[0]
+    matched_title = movie_titles[matched_idx]
     
-    # Compute similarity scores
-    cosine_sim = cosine_similarity(tfidf_matrix[matched_idx], tfidf_matrix).flatten()
-    similar_indices = cosine_sim.argsort()[-(top_n + 1):][::-1]
+    # Rows are L2-normalized, so dot products over the posting lists of the
+    # movie's terms are the cosine similarities
+    similar_indices, similarity_scores = sparse_top_k(tfidf_matrix[matched_idx], inverted_index(tfidf_matrix), top_n + 1)
+    similar_indices, similarity_scores = similar_indices[0], similarity_scores[0]
     
     # Get recommendations
     recommendations = movies_df.iloc[similar_indices]
     
-    # Add similarity scores with enhanced scaling for better differentiation
-    similarity_scores = cosine_sim[similar_indices]
-    
     # Apply improved scaling for better differentiation between recommendations
     
     # First normalize to [0,1] range
     normalized_scores = similarity_scores / similarity_scores[0]  # Divide by self-similarity
     
-    # Debug the raw scores - should print during API calls
-    print(f"Raw normalized scores: {normalized_scores}")
+    # Debug the raw scores; lazy %-formatting so this costs nothing unless DEBUG is on
+    logger.debug("Raw normalized scores: %s", normalized_scores)
     
     # Apply a more balanced transformation with better spread:
     # This helps create greater differences between similar items while
@@ -85,7 +104,7 @@ def recommend_movies(input_title, top_n=6):
     scaled_scores = np.round(scaled_scores).astype(int)
     
     # Debug the final scores
-    print(f"Final scaled scores: {scaled_scores}")
+    logger.debug("Final scaled scores: %s", scaled_scores)
     
     # Assign to recommendations dataframe
     recommendations['similarity'] = scaled_scores
@@ -96,85 +115,266 @@ def recommend_movies(input_title, top_n=6):
     # Select columns to return, including poster_url, vote_average, and similarity
     return recommendations[['title', 'overview', 'genres', 'actors', 'directors', 'poster_url', 'vote_average', 'similarity']][:top_n]
 
-def hybrid_recommend_movies(input_title, top_n=6):
+class RecommenderEngine:
     """
-    Hybrid recommendation combining content-based filtering
-    This is a simplified version as we no longer have user ratings
-    We weight different features instead of using collaborative filtering
+    Long-lived hybrid recommender.
+    Holds the catalog's MovieTable, the fitted feature pipeline and the
+    sparse feature matrix so that each request only does title matching
+    and a single-row similarity.
+    """
+
+    def __init__(self, movies, features=None, tfidf_matrix=None, version=None, neighbors=None):
+        self.movies = movies
+        # Views into the MovieTable, not copies (see MovieTable.row for id lookups)
+        self.movie_titles = movies.titles
+        self.movie_ids = movies.ids
+        self.title_matcher = TitleMatcher(self.movie_titles)
+        self.version = version
+        # Precomputed (indices, scores) top-K table, see src/neighbors.py
+        self.neighbors = neighbors
+        self._postings = None
+        # Pre-serialized response fields of each movie, see to_json
+        self.fragments = MovieFragments(movies, RESULT_COLUMNS[:-1])
+        
+        if features is None:
+            # Per-field TF-IDF blocks, weighted and stacked
+            features = FeaturePipeline()
+            tfidf_matrix = features.fit_transform(movies.frame())
+        self.features = features
+        self.tfidf_matrix = tfidf_matrix
+        
+        # Lowercased franchise of each movie for the franchise boost
+        self.franchises = [extract_franchise_name(title).lower() for title in self.movie_titles]
+
+    @property
+    def postings(self):
+        """Term -> movie posting lists for exact scoring, built on first use"""
+        if self._postings is None:
+            self._postings = inverted_index(self.tfidf_matrix)
+        return self._postings
+
+    @timed("title_match")
+    def match_title(self, input_title, min_score=0):
+        """Return the row index of the closest title match scoring at least `min_score`, or None"""
+        # Hash lookups first, then trigram-blocked fuzzy matching
+        return self.title_matcher.match(input_title, min_score)
+
+    @timed("similarity")
+    def similar(self, idx, count):
+        """Indices and raw cosine scores of the `count` movies most similar to row `idx`"""
+        if self.neighbors is not None and count <= self.neighbors[0].shape[1]:
+            # O(1) lookup in the precomputed neighbor table
+            indices, scores = self.neighbors
+            return np.asarray(indices[idx, :count]), np.asarray(scores[idx, :count], dtype=np.float64)
+        
+        # Rows are L2-normalized, so dot products over the posting lists of
+        # the movie's terms are the cosine similarities
+        indices, scores = sparse_top_k(self.tfidf_matrix[idx], self.postings, count)
+        return indices[0], scores[0]
+
+    @timed("similarity")
+    def similar_many(self, rows, count):
+        """
+        Indices and raw cosine scores of the `count` most similar movies for
+        each of several rows, as two (len(rows), count) arrays
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        if self.neighbors is not None and count <= self.neighbors[0].shape[1]:
+            indices, scores = self.neighbors
+            return np.asarray(indices[rows, :count]), np.asarray(scores[rows, :count], dtype=np.float64)
+        
+        # One sparse product against the posting lists for all seeds
+        return sparse_top_k(self.tfidf_matrix[rows], self.postings, count)
+
+    @timed("similarity")
+    def similar_filtered(self, idx, count, allowed):
+        """
+        Like similar(), but only over the rows set in the boolean mask
+        `allowed` (see src/facets.py). The seed row is always kept, since
+        scores are scaled against its self-similarity.
+        """
+        allowed = allowed.copy()
+        allowed[idx] = True
+        if self.neighbors is not None:
+            indices, scores = self.neighbors
+            indices = np.asarray(indices[idx])
+            keep = allowed[indices]
+            # The table is the global top-K, so if enough of it passes the
+            # filter those rows are also the filtered top
+            if keep.sum() >= count:
+                return indices[keep][:count], np.asarray(scores[idx], dtype=np.float64)[keep][:count]
+        indices, scores = sparse_top_k(self.tfidf_matrix[idx], self.postings, count, allowed=allowed)
+        return indices[0], scores[0]
+
+    def recommend(self, input_title, top_n=6):
+        return self.recommend_row(self.match_title(input_title), top_n)
+
+    def recommend_row(self, matched_idx, top_n=6, allowed=None):
+        """
+        Recommendations for an already resolved catalog row (None gives no
+        results), restricted to the rows set in `allowed` if given
+        """
+        if matched_idx is None:
+            return pd.DataFrame({'title': [], 'overview': []})
+        
+        if allowed is None:
+            similar_indices, similarity_scores = self.similar(matched_idx, top_n + 1)
+        else:
+            similar_indices, similarity_scores = self.similar_filtered(matched_idx, top_n + 1, allowed)
+            if len(similar_indices) < 2:
+                # Nothing but the seed itself passes the filters
+                return pd.DataFrame({'title': [], 'overview': []})
+        return self._recommendations(matched_idx, similar_indices, similarity_scores, top_n)
+
+    def recommend_batch(self, input_titles, top_n=6, merged=False):
+        """
+        Recommendations for many seed titles at once.
+        Titles are resolved together and scored with a single similarity
+        computation. Returns a list of (input title, matched title or None,
+        recommendations DataFrame) and, if `merged` is set, a "more like
+        these" DataFrame ranked against the averaged profile of all seeds.
+        """
+        matched = [self.match_title(title) for title in input_titles]
+        seed_rows = sorted({idx for idx in matched if idx is not None})
+        
+        per_seed = {}
+        if seed_rows:
+            all_indices, all_scores = self.similar_many(seed_rows, top_n + 1)
+            for row, similar_indices, similarity_scores in zip(seed_rows, all_indices, all_scores):
+                per_seed[row] = self._recommendations(row, similar_indices, similarity_scores, top_n)
+        
+        results = []
+        for title, idx in zip(input_titles, matched):
+            if idx is None:
+                results.append((title, None, pd.DataFrame({'title': [], 'overview': []})))
+            else:
+                results.append((title, self.movie_titles[idx], per_seed[idx]))
+        
+        if not merged:
+            return results, None
+        return results, self.recommend_profile(seed_rows, top_n)
+
+    def recommend_profile(self, seed_rows, top_n=6):
+        """Movies closest to the averaged feature vector of the seed rows, excluding the seeds"""
+        if len(seed_rows) == 0:
+            return pd.DataFrame({'title': [], 'overview': []})
+        profile = sparse.csr_matrix(self.tfidf_matrix[seed_rows].mean(axis=0))
+        return self.recommend_vector(profile, seed_rows, top_n)
+
+    @timed("profile")
+    def recommend_vector(self, profile, exclude_rows=(), top_n=6):
+        """
+        Movies closest to a 1 x features `profile` vector (see
+        src/profiles.py), excluding `exclude_rows`. One sparse product over
+        the posting lists of the profile's terms.
+        """
+        norm = np.linalg.norm(profile.data)
+        if norm == 0:
+            return pd.DataFrame({'title': [], 'overview': []})
+        top, top_scores = sparse_top_k(profile / norm, self.postings, top_n, exclude=set(exclude_rows))
+        # Only movies that actually match the profile
+        top = top[0][top_scores[0] > 0]
+        top_scores = top_scores[0][:len(top)]
+        if len(top) == 0:
+            return pd.DataFrame({'title': [], 'overview': []})
+        
+        # Scale as if the profile were a movie with self-similarity 1
+        scores = np.concatenate(([1.0], top_scores))
+        adjusted_scores = _spread_scores(scores)
+        recommendations = self.movies.frame(top, RESULT_COLUMNS[:-1])
+        recommendations['similarity'] = _display_scores(adjusted_scores)[1:]
+        return recommendations[RESULT_COLUMNS]
+
+    def to_json(self, recommendations):
+        """
+        JSON bytes of a recommendations DataFrame from this engine, built
+        from the cached per-movie fragments (its index holds catalog rows)
+        """
+        if recommendations.empty:
+            return b"[]"
+        return self.fragments.render(recommendations.index, recommendations['similarity'])
+
+    @timed("rank")
+    def _recommendations(self, matched_idx, similar_indices, similarity_scores, top_n):
+        """Rescale raw similarities for one seed and build the response rows"""
+        matched_title = self.movie_titles[matched_idx]
+        
+        # Get recommendations
+        recommendations = self.movies.frame(similar_indices, RESULT_COLUMNS[:-1])
+        
+        # Add similarity scores with enhanced scaling for better differentiation
+        adjusted_scores = _spread_scores(similarity_scores)
+        
+        # Boost franchise match detection by checking titles
+        for i in range(1, len(similar_indices)):
+            rec_title = self.movie_titles[similar_indices[i]]
+            
+            # Check if these titles are likely from the same franchise
+            rec_franchise = self.franchises[similar_indices[i]]
+            input_franchise = self.franchises[similar_indices[0]]
+            
+            # If franchise names match, give a boost
+            if rec_franchise == input_franchise and len(rec_franchise) > 2:
+                adjusted_scores[i] = min(adjusted_scores[i] * 1.2, 0.95)  # Boost but don't exceed 0.95
+                logger.debug("Franchise match detected: %s - boosting score", rec_title)
+        
+        scaled_scores = _display_scores(adjusted_scores)
+        
+        # Debug the final scores
+        logger.debug("Final scaled scores: %s", scaled_scores)
+        
+        # Assign to recommendations dataframe
+        recommendations['similarity'] = scaled_scores
+        
+        # Remove the input movie itself
+        recommendations = recommendations[recommendations['title'] != matched_title]
+        
+        # Select columns to return, including poster_url, vote_average, and similarity
+        return recommendations[RESULT_COLUMNS][:top_n]
+
+class AnnRecommenderEngine(RecommenderEngine):
+    """
+    RecommenderEngine that gets candidates from an IVF index over dense
+    LSA embeddings (see src/ann.py) instead of scanning every movie, and
+    rescores them with the exact TF-IDF cosine. `nprobe` trades recall
+    for latency.
+    """
+
+    def __init__(self, movies, features, tfidf_matrix, ann, version=None, nprobe=ANN_NPROBE):
+        super().__init__(movies, features, tfidf_matrix, version=version)
+        self.ann = ann
+        self.nprobe = nprobe
+
+    def _candidates(self, idx, count):
+        nprobe = self.nprobe
+        while True:
+            rows, _ = self.ann.search(self.ann.vectors[idx], count * ANN_RERANK, nprobe)
+            # Probe more lists when the nearest ones are too small
+            if len(rows) >= count or nprobe >= len(self.ann.centroids):
+                return np.union1d(rows, [idx])
+            nprobe *= 2
+
+    @timed("similarity")
+    def similar(self, idx, count):
+        rows = self._candidates(idx, count)
+        sims = (self.tfidf_matrix[rows] @ self.tfidf_matrix[idx].T).toarray().ravel()
+        top = top_k(sims, count)
+        return rows[top], sims[top]
+
+    def similar_many(self, rows, count):
+        results = [self.similar(row, count) for row in rows]
+        return np.stack([r[0] for r in results]), np.stack([r[1] for r in results])
+
+def _spread_scores(similarity_scores):
+    """
+    Normalize raw similarities against the first (self) score and spread
+    them out for better differentiation between recommendations
     """
-    movies_df = load_tmdb_data()
-    
-    # Weight different features differently
-    movies_df["weighted_features"] = (
-        # Give plot/overview higher weight (x3)
-        movies_df["overview"].fillna("") + " " + 
-        movies_df["overview"].fillna("") + " " + 
-        movies_df["overview"].fillna("") + " " + 
-        # Give genre good weight (x2)
-        movies_df["genres"].apply(lambda g: " ".join(g)) + " " +
-        movies_df["genres"].apply(lambda g: " ".join(g)) + " " +
-        # Actors and directors get normal weight
-        movies_df["actors"].apply(lambda a: " ".join(a)) + " " +
-        movies_df["directors"].apply(lambda d: " ".join(d))
-    )
-    
-    # Add extra weight to title similarities to boost franchise matches
-    # Extract the franchise name from the title (like "Alien" or "Star Wars")
-    def extract_franchise_name(title):
-        # Split on common franchise separators and get the first part
-        separators = [":", " - ", " – ", ",", ".", "Part", "Chapter", "Volume"]
-        base_title = title
-        for sep in separators:
-            if sep in title:
-                base_title = title.split(sep)[0].strip()
-                break
-                
-        # Handle numbered sequels (e.g., "Alien 3", "Terminator 2")
-        base_title = re.sub(r'\s+\d+$', '', base_title).strip()
-        
-        # Return the first 1-3 words which often indicate the franchise
-        words = base_title.split()
-        franchise = " ".join(words[:min(3, len(words))])
-        return franchise
-    
-    # Add franchise name with very high weight to boost franchise matches (increased from 3x to 5x)
-    movies_df["weighted_features"] = movies_df["weighted_features"] + " " + \
-                                     movies_df["title"].apply(extract_franchise_name) + " " + \
-                                     movies_df["title"].apply(extract_franchise_name) + " " + \
-                                     movies_df["title"].apply(extract_franchise_name) + " " + \
-                                     movies_df["title"].apply(extract_franchise_name) + " " + \
-                                     movies_df["title"].apply(extract_franchise_name)
-    
-    # TF-IDF on weighted features
-    tfidf = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = tfidf.fit_transform(movies_df['weighted_features'])
-    
-    # Use fuzzy matching to find closest title match
-    movie_titles = movies_df['title'].tolist()
-    match = process.extractOne(input_title, movie_titles)
-    if not match:
-        return pd.DataFrame({'title': [], 'overview': []})
-    
-    matched_title = match[0]
-    matched_idx = movies_df[movies_df['title'] == matched_title].index[0]
-    
-    # Compute similarity scores
-    cosine_sim = cosine_similarity(tfidf_matrix[matched_idx], tfidf_matrix).flatten()
-    similar_indices = cosine_sim.argsort()[-(top_n + 1):][::-1]
-    
-    # Get recommendations
-    recommendations = movies_df.iloc[similar_indices]
-    
-    # Add similarity scores with enhanced scaling for better differentiation
-    similarity_scores = cosine_sim[similar_indices]
-    
-    # Apply improved scaling for better differentiation between recommendations
-    
     # First normalize to [0,1] range
     normalized_scores = similarity_scores / similarity_scores[0]  # Divide by self-similarity
     
-    # Debug the raw scores - should print during API calls
-    print(f"Raw normalized scores: {normalized_scores}")
+    # Debug the raw scores; lazy %-formatting so this costs nothing unless DEBUG is on
+    logger.debug("Raw normalized scores: %s", normalized_scores)
     
     # Apply a more balanced transformation with better spread:
     # This helps create greater differences between similar items while
@@ -188,22 +388,10 @@ def hybrid_recommend_movies(input_title, top_n=6):
     rank_factor = 1.0 - (ranks / (len(ranks) - 1)) * 0.5  # Scale from 1.0 to 0.5
     
     # Apply rank factor to further separate scores
-    adjusted_scores = balanced_scores * rank_factor
-    
-    # Boost franchise match detection by checking titles
-    for i in range(1, len(similar_indices)):
-        rec_title = movies_df.iloc[similar_indices[i]]['title']
-        input_title = movies_df.iloc[similar_indices[0]]['title']
-        
-        # Check if these titles are likely from the same franchise
-        rec_franchise = extract_franchise_name(rec_title).lower()
-        input_franchise = extract_franchise_name(input_title).lower()
-        
-        # If franchise names match, give a boost
-        if rec_franchise == input_franchise and len(rec_franchise) > 2:
-            adjusted_scores[i] = min(adjusted_scores[i] * 1.2, 0.95)  # Boost but don't exceed 0.95
-            print(f"Franchise match detected: {rec_title} - boosting score")
-    
+    return balanced_scores * rank_factor
+
+def _display_scores(adjusted_scores):
+    """Map adjusted scores to integer display percentages"""
     # Map to percentage range with more meaningful spread
     min_display = 55  # Minimum percentage
     max_display = 98  # Maximum percentage
@@ -212,16 +400,194 @@ def hybrid_recommend_movies(input_title, top_n=6):
     scaled_scores = min_display + adjusted_scores * (max_display - min_display)
     
     # Round to integers
-    scaled_scores = np.round(scaled_scores).astype(int)
-    
-    # Debug the final scores
-    print(f"Final scaled scores: {scaled_scores}")
-    
-    # Assign to recommendations dataframe
-    recommendations['similarity'] = scaled_scores
-    
-    # Remove the input movie itself
-    recommendations = recommendations[recommendations['title'] != matched_title]
-    
-    # Select columns to return, including poster_url, vote_average, and similarity
-    return recommendations[['title', 'overview', 'genres', 'actors', 'directors', 'poster_url', 'vote_average', 'similarity']][:top_n]
+    return np.round(scaled_scores).astype(int)
+
+# Shared engine, built once per process (see get_engine)
+_engine = None
+
+def _build_index(model_path, index=RECOMMENDER_INDEX):
+    if index == "ann":
+        build_ann_index(model_path)
+    else:
+        build_neighbor_table(model_path)
+
+def _needs_refit(model, n_rows):
+    return model["manifest"].get("patched_rows", 0) > MODEL_PATCH_LIMIT * n_rows
+
+@timed("engine_load")
+def load_engine(catalog_path=CATALOG_PATH, model_dir=MODEL_DIR, catalog=None, index=RECOMMENDER_INDEX):
+    """
+    Load the engine from the persisted model artifact, refitting and
+    re-saving it only when the catalog's content hash has changed or too
+    much of it was patched in place (see update_model).
+    `index` picks the exact neighbor table or the approximate IVF index.
+    """
+    if catalog is None:
+        catalog = get_catalog() if catalog_path == CATALOG_PATH else load_catalog(catalog_path)
+    source_hash = catalog.source_hash
+    movies = catalog.movies
+    model = load_model(source_hash, model_dir)
+    if model is None or model["titles"] != movies.column('title') or _needs_refit(model, len(movies)):
+        with span("model_build"):
+            engine = RecommenderEngine(movies, version=source_hash)
+            save_model(
+                source_hash, engine.features, engine.tfidf_matrix, engine.movie_titles, model_dir,
+                finish=lambda path: _build_index(path, index), replace=model is not None,
+            )
+        model = load_model(source_hash, model_dir)
+    
+    features = FeaturePipeline.from_state(model["manifest"]["field_weights"], model["vocabularies"], model["idfs"])
+    if index == "ann":
+        ann = load_ann_index(model["path"])
+        if ann is None:
+            with span("ann_build"):
+                build_ann_index(model["path"])
+            ann = load_ann_index(model["path"])
+        return AnnRecommenderEngine(movies, features, model["tfidf_matrix"], ann, version=source_hash)
+    
+    neighbors = load_neighbor_table(model["path"])
+    if neighbors is None:
+        with span("neighbor_build"):
+            build_neighbor_table(model["path"])
+        neighbors = load_neighbor_table(model["path"])
+    return RecommenderEngine(movies, features, model["tfidf_matrix"], version=source_hash, neighbors=neighbors)
+
+@timed("model_update")
+def update_model(changed_ids, catalog_path=CATALOG_PATH, model_dir=MODEL_DIR):
+    """
+    Patch the persisted artifact after the movies in `changed_ids` were
+    updated in place in the catalog. Only those rows are re-vectorized (with
+    the existing vocabularies, so brand new terms wait for the next full
+    fit) and only neighbor rows that could have changed are recomputed.
+    Falls back to a full rebuild when no compatible previous artifact exists
+    or more than MODEL_PATCH_LIMIT of the catalog has been patched since
+    the last one.
+    """
+    catalog = load_catalog(catalog_path)
+    source_hash = catalog.source_hash
+    movies = catalog.movies
+    if load_model(source_hash, model_dir) is not None:
+        return
+    
+    previous = load_latest_model(model_dir)
+    changed_ids = set(changed_ids)
+    changed = np.isin(movies.ids, list(changed_ids))
+    titles = movies.column('title')
+    if previous is None or len(previous["titles"]) != len(titles) or any(
+        old != new for old, new, is_changed in zip(previous["titles"], titles, changed) if not is_changed
+    ):
+        logger.info("No compatible model artifact to patch, rebuilding")
+        load_engine(catalog_path, model_dir, catalog)
+        return
+    
+    rows = np.flatnonzero(changed)
+    patched_rows = previous["manifest"].get("patched_rows", 0) + len(rows)
+    if patched_rows > MODEL_PATCH_LIMIT * len(titles):
+        logger.info(f"{patched_rows} rows patched since the last fit, rebuilding")
+        load_engine(catalog_path, model_dir, catalog)
+        return
+    
+    old_neighbors = load_neighbor_table(previous["path"])
+    if old_neighbors is not None:
+        # Copy out before the previous artifact gets pruned
+        old_neighbors = (np.array(old_neighbors[0]), np.array(old_neighbors[1]))
+    
+    features = FeaturePipeline.from_state(previous["manifest"]["field_weights"], previous["vocabularies"], previous["idfs"])
+    old_matrix = previous["tfidf_matrix"]
+    new_rows = features.transform(movies.frame(rows)).tocoo()
+    
+    # Zero out the changed rows and add their new vectors in place
+    keep = np.ones(old_matrix.shape[0])
+    keep[rows] = 0.0
+    replacement = sparse.csr_matrix(
+        (new_rows.data, (rows[new_rows.row], new_rows.col)), shape=old_matrix.shape
+    )
+    matrix = (sparse.diags(keep) @ old_matrix + replacement).tocsr()
+    matrix.sort_indices()
+    
+    def finish(path):
+        # Runs on the unpublished artifact, so the server never sees it without its index
+        if RECOMMENDER_INDEX == "ann" or old_neighbors is None:
+            # ANN embeddings depend on the whole matrix, so they're refit
+            _build_index(path)
+            return
+        _, _, recomputed = update_neighbor_table(path, old_neighbors[0], old_neighbors[1], rows)
+        logger.info(f"Patched {len(rows)} model rows, recomputed {recomputed} neighbor rows")
+    
+    save_model(source_hash, features, matrix, titles, model_dir, patched_rows=patched_rows, finish=finish)
+
+def get_engine():
+    """Return the process-wide recommender engine, loading it on first use"""
+    global _engine
+    if _engine is None:
+        _engine = load_engine()
+    return _engine
+
+def set_engine(engine):
+    """Replace the process-wide engine, e.g. with a reloaded one (see src/reload.py)"""
+    global _engine
+    _engine = engine
+
+def hybrid_recommend_movies(input_title, top_n=6, user_id=None):
+    """
+    Hybrid recommendation: content neighbors of `input_title` and the
+    collaborative model's picks for `user_id`, re-ranked on blended
+    scores (see src/hybrid.py)
+    """
+    from .hybrid import get_hybrid_ranker
+    return get_hybrid_ranker().recommend(input_title, user_id, top_n)
+
+def batch_recommend_movies(input_titles, top_n=6, merged=False):
+    """
+    Recommendations for several seed titles in one call, plus an optional
+    merged "more like these" list for the whole set
+    """
+    return get_engine().recommend_batch(input_titles, top_n, merged)
+
+# Entry points for the recommend worker pool (see src/worker_pool.py). They
+# take and return plain Python values so they pickle cheaply.
+
+def content_job(title, row=None, filters=None):
+    """
+    Resolve `title` (unless its `row` is already known) and return
+    (engine version, row, JSON response body). `filters` are
+    FacetIndex.mask keyword arguments.
+    """
+    engine = get_engine()
+    if row is None:
+        row = engine.match_title(title)
+    allowed = get_catalog().facets.mask(**filters) if filters else None
+    recs = engine.recommend_row(row, allowed=allowed)
+    with span("serialize"):
+        return engine.version, row, engine.to_json(recs)
+
+def batch_job(titles, top_n=6, merged=False):
+    """Batch recommendations as a JSON response body"""
+    engine = get_engine()
+    results, merged_df = engine.recommend_batch(titles, top_n, merged)
+    with span("serialize"):
+        entries = [
+            b'{"title":' + dumps(title) + b',"matched_title":' + dumps(matched_title)
+            + b',"recommendations":' + engine.to_json(recs) + b'}'
+            for title, matched_title, recs in results
+        ]
+        merged_json = engine.to_json(merged_df) if merged_df is not None else b"null"
+        return b'{"results":[' + b",".join(entries) + b'],"merged":' + merged_json + b'}'
+
+def profile_job(vector, exclude_rows, top_n, version):
+    """
+    (engine version, JSON response body) for a profile vector built
+    against engine `version`; the body is None if this process has
+    another model loaded, whose vocabulary the vector doesn't fit
+    """
+    engine = get_engine()
+    if engine.version != version:
+        return engine.version, None
+    recs = engine.recommend_vector(vector, exclude_rows, top_n)
+    with span("serialize"):
+        return engine.version, engine.to_json(recs)
+
+if __name__ == "__main__":
+    # Offline build step: python -m src.recommend_enhanced
+    engine = load_engine()
+    print(f"Model artifact ready for {len(engine.movie_titles)} movies (catalog {engine.version[:16]})")
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .catalog import CATALOG_PATH, _file_stamp, get_catalog, load_catalog, set_catalog
+from .collab import COLLAB_DIR, get_collab_model, load_collab_model, set_collab_model
+from .recommend_enhanced import AnnRecommenderEngine, get_engine, load_engine, set_engine
+from .worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the catalog file and the collaborative model;
+# 0 turns the watcher off
+RELOAD_INTERVAL = float(os.getenv("RELOAD_INTERVAL", "5"))
+
+def _stamp(path):
+    # (mtime, size) of a file or directory, None if it doesn't exist
+    return _file_stamp(path) if os.path.exists(path) else None
+
+def _build_model(catalog_path):
+    # Runs in its own process, so refitting TF-IDF and the neighbor table
+    # doesn't compete with request handling for the GIL
+    load_engine(catalog_path)
+
+class Reloader:
+    """
+    Hot reload of the catalog, the content model and the collaborative
+    model. watch() polls the catalog file and the collaborative model
+    directory; once a change has been stable for one interval (so a
+    crawl that is still appending isn't picked up half way), reload()
+    builds the new model artifact in a separate process, loads the new
+    catalog and models and warms a fresh set of pool workers, all off
+    the event loop. It then swaps every reference at once on the event
+    loop: requests already running finish on the old objects, later ones
+    see only the new ones, and the old workers exit once drained.
+    """
+
+    def __init__(self, pool, catalog_path=CATALOG_PATH, collab_dir=COLLAB_DIR, interval=RELOAD_INTERVAL):
+        self.pool = pool
+        self.catalog_path = catalog_path
+        self.collab_dir = collab_dir
+        self.interval = interval
+        self.state = "idle"
+        self.reloads = 0
+        self.last_reload_at = None
+        self.last_duration = None
+        self.last_error = None
+        self._loaded = None
+        self._changed = None
+        self._lock = asyncio.Lock()
+
+    def _stamps(self):
+        return _stamp(self.catalog_path), _stamp(self.collab_dir)
+
+    def mark_loaded(self):
+        """Record the files the current catalog and models were loaded from"""
+        self._loaded = self._stamps()
+
+    def changed(self):
+        """True once the watched files differ from the loaded ones and have settled"""
+        stamps = self._stamps()
+        if stamps == self._loaded or stamps[0] is None:
+            self._changed = None
+            return False
+        if stamps != self._changed:
+            # Seen for the first time (or still moving); check again next interval
+            self._changed = stamps
+            return False
+        return True
+
+    async def watch(self):
+        """Check for changes every `interval` seconds until cancelled"""
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.changed():
+                await self.reload()
+
+    def _load(self):
+        stamps = self._stamps()
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as builder:
+            builder.submit(_build_model, self.catalog_path).result()
+        catalog = load_catalog(self.catalog_path)
+        # Built now rather than by the first request after the swap
+        catalog.suggest_index
+        catalog.facets
+        engine = load_engine(self.catalog_path, catalog=catalog)
+        collab = load_collab_model(self.collab_dir)
+        return stamps, catalog, engine, collab
+
+    async def reload(self):
+        """Build and swap in the current catalog and models; False if that failed"""
+        async with self._lock:
+            self.state = "building"
+            start = time.perf_counter()
+            try:
+                stamps, catalog, engine, collab = await asyncio.to_thread(self._load)
+                # The new workers load the same artifact the build just wrote
+                executor = await asyncio.to_thread(self.pool.prepare)
+            except Exception as e:
+                logger.exception("Reload failed, still serving the previous version")
+                self.last_error = f"{type(e).__name__}: {e}"
+                # Don't retry the same broken files every interval
+                self._loaded = self._stamps()
+                self.state = "idle"
+                return False
+
+            # No awaits from here to the swap, so requests see all old or all new
+            set_catalog(catalog)
+            set_engine(engine)
+            set_collab_model(collab)
+            previous = self.pool.swap(executor)
+            self._loaded = stamps
+            self._changed = None
+            self.reloads += 1
+            self.last_reload_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+            self.last_duration = time.perf_counter() - start
+            self.last_error = None
+            logger.info("Reloaded catalog %s (%d movies) in %.1fs",
+                        catalog.source_hash[:16], len(catalog), self.last_duration)
+
+            self.state = "draining"
+            await asyncio.to_thread(WorkerPool.retire, previous)
+            self.state = "idle"
+            return True
+
+    def status(self):
+        catalog, engine, collab = get_catalog(), get_engine(), get_collab_model()
+        return {
+            "catalog": {"path": catalog.path, "source_hash": catalog.source_hash, "movies": len(catalog)},
+            "model": {
+                "version": engine.version,
+                "index": "ann" if isinstance(engine, AnnRecommenderEngine) else "exact",
+            },
+            "collab": None if collab is None else {"version": collab.version, "users": len(collab)},
+            "reload": {
+                "state": self.state,
+                "watching": self.interval > 0,
+                "interval_s": self.interval,
+                "reloads": self.reloads,
+                "last_reload_at": self.last_reload_at,
+                "last_duration_s": self.last_duration,
+                "last_error": self.last_error,
+            },
+        }
@@ -0,0 +1,81 @@
+import numpy as np
+from scipy import sparse
+
+def top_k(scores, k):
+    """Indices of the k highest scores, best first, lowest index first on ties"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    top = np.argpartition(-scores, k - 1)[:k]
+    if k < len(scores):
+        # argpartition keeps an arbitrary subset of the items tied at the
+        # k-th score; swap in the lowest indices among them
+        kth = scores[top].min()
+        at_kth = scores[top] == kth
+        tied = np.flatnonzero(scores == kth)
+        if len(tied) > np.count_nonzero(at_kth):
+            top = np.concatenate([top[~at_kth], tied[:np.count_nonzero(at_kth)]])
+    return top[np.lexsort((top, -scores[top]))]
+
+def inverted_index(matrix):
+    """
+    Term -> movie posting lists of a CSR feature matrix, as the CSR matrix
+    of its transpose: row t lists the movies containing term t
+    """
+    postings = sparse.csr_matrix(matrix.T)
+    postings.sort_indices()
+    return postings
+
+def sparse_top_k(queries, postings, k, exclude=None, allowed=None):
+    """
+    Top-k dot products of each query row against every movie, walking only
+    the posting lists of the queries' nonzero terms. Movies that share no
+    term with a query are never scored. Returns (indices, scores) arrays of
+    shape (len(queries), k); if fewer than k movies score above zero (a
+    rating-weighted profile can score below), the rest is padded with
+    zero-score movies in catalog order. `exclude` is a
+    set of movie rows never to return, and `allowed` an optional boolean
+    mask of the only rows that may be returned.
+    """
+    queries = sparse.csr_matrix(queries)
+    n_rows = postings.shape[1]
+    if allowed is None:
+        k = min(k, n_rows - len(exclude or ()))
+    else:
+        k = min(k, int(np.count_nonzero(allowed)) - sum(1 for row in exclude or () if allowed[row]))
+    k = max(k, 0)
+    # (queries x terms) @ (terms x movies): only touched movies get entries
+    products = (queries @ postings).tocsr()
+    products.sort_indices()
+
+    indices = np.zeros((queries.shape[0], k), dtype=np.intp)
+    scores = np.zeros((queries.shape[0], k), dtype=np.float64)
+    for i in range(queries.shape[0]):
+        start, end = products.indptr[i], products.indptr[i + 1]
+        rows = products.indices[start:end]
+        values = products.data[start:end]
+        positive = values > 0
+        rows, values = rows[positive], values[positive]
+        if allowed is not None:
+            keep = allowed[rows]
+            rows, values = rows[keep], values[keep]
+        if exclude:
+            keep = ~np.isin(rows, list(exclude))
+            rows, values = rows[keep], values[keep]
+        top = top_k(values, k)
+        found = len(top)
+        indices[i, :found] = rows[top]
+        scores[i, :found] = values[top]
+        if found < k:
+            taken = set(rows[top].tolist()) | set(exclude or ())
+            indices[i, found:] = _padding(taken, k - found, n_rows, allowed)
+    return indices, scores
+
+def _padding(taken, count, n_rows, allowed=None):
+    rows = []
+    for row in (range(n_rows) if allowed is None else np.flatnonzero(allowed).tolist()):
+        if row not in taken:
+            rows.append(row)
+            if len(rows) == count:
+                break
+    return rows
@@ -0,0 +1,73 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import numpy as np
+
+try:
+    # Optional, several times faster than the standard library encoder
+    import orjson
+except ImportError:
+    orjson = None
+
+# Movies whose serialized fields are kept per process, least recently used
+# evicted first; 0 turns the cache off
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "20000"))
+
+def _default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, Mapping):
+        # e.g. MovieTable.movie() views
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(data):
+    """Compact UTF-8 JSON bytes of `data`, accepting NumPy scalars and arrays and read-only mappings"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class MovieFragments:
+    """
+    JSON of each movie's response fields, serialized once on first use.
+    A recommendation list is then assembled from these cached bytes and
+    the per-request similarity, without building dicts or re-encoding
+    the overview and cast lists on every request. At most `max_entries`
+    fragments are kept; a reload builds a new engine, and with it an empty
+    cache for the new catalog.
+    """
+
+    def __init__(self, movies, columns, max_entries=FRAGMENT_CACHE_SIZE):
+        # A MovieTable (src/movie_table.py), read one movie at a time
+        self.movies = movies
+        self.columns = columns
+        self.max_entries = max_entries
+        # row -> b'{"title":...,"vote_average":7.1' (object left open)
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fragment(self, row):
+        with self._lock:
+            body = self._fragments.get(row)
+            if body is not None:
+                self._fragments.move_to_end(row)
+                return body
+        body = dumps(self.movies.record(row, self.columns))[:-1]
+        if self.max_entries > 0:
+            with self._lock:
+                self._fragments[row] = body
+                while len(self._fragments) > self.max_entries:
+                    self._fragments.popitem(last=False)
+        return body
+
+    def render(self, rows, similarities):
+        """JSON array of the movies at `rows`, each with its similarity added"""
+        return b"[" + b",".join(
+            self.fragment(int(row)) + b',"similarity":%d}' % similarity
+            for row, similarity in zip(rows, similarities)
+        ) + b"]"
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import logging
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .metrics import span
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FILE = "data/tmdb_movies.jsonl"
+
+# Columnar export of the catalog, see export_columnar
+COLUMNAR_FILE = "data/tmdb_movies.parquet"
+
+# Pretty-printed JSON array written by older versions of the fetcher
+LEGACY_CATALOG_FILE = "data/tmdb_movies.json"
+
+# Genres and people repeat across thousands of movies, so their list
+# columns are dictionary-encoded both on disk and in memory
+_names = pa.list_(pa.dictionary(pa.int32(), pa.string()))
+
+CATALOG_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("title", pa.string()),
+    ("overview", pa.string()),
+    ("genres", _names),
+    ("actors", _names),
+    ("directors", _names),
+    ("release_date", pa.string()),
+    ("poster_url", pa.string()),
+    ("vote_average", pa.float64()),
+])
+
+def catalog_hash(path):
+    """Content hash of the source catalog file"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class CatalogLog:
+    """
+    Append-only JSON Lines storage for the movie catalog.
+    Every write appends one line per movie and fsyncs, so saving progress
+    costs time proportional to the new records only. A later line for the
+    same id replaces the earlier one while keeping its position. compact()
+    rewrites the file with one line per movie through an atomic rename, so
+    a crash never leaves a corrupt catalog behind.
+    """
+
+    def __init__(self, path=CATALOG_FILE, legacy_path=None):
+        self.path = path
+        if legacy_path is None and path == CATALOG_FILE:
+            legacy_path = LEGACY_CATALOG_FILE
+        self.legacy_path = legacy_path
+        # Lines in the file at the last read/write, to decide when to compact
+        self.line_count = 0
+
+    def exists(self):
+        return os.path.exists(self.path) or bool(self.legacy_path and os.path.exists(self.legacy_path))
+
+    def read(self):
+        """All movies, latest version of each, in first-seen order"""
+        if not os.path.exists(self.path):
+            if self.legacy_path and os.path.exists(self.legacy_path):
+                return self._migrate_legacy()
+            return []
+
+        movies = []
+        positions = {}
+        self.line_count = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    movie = json.loads(line)
+                except ValueError:
+                    # Most likely a torn write at the end of the file
+                    logger.warning(f"Skipping unreadable line {line_number} in {self.path}")
+                    continue
+                self.line_count += 1
+                position = positions.get(movie["id"])
+                if position is None:
+                    positions[movie["id"]] = len(movies)
+                    movies.append(movie)
+                else:
+                    movies[position] = movie
+        return movies
+
+    def append(self, movies):
+        """Append (or supersede) records in one batch"""
+        if not movies:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a+b") as f:
+            # Don't glue the first record onto a torn last line
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write("".join(self._line(movie) for movie in movies).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        self.line_count += len(movies)
+
+    def compact(self, movies=None):
+        """Rewrite the file with one line per movie and atomically swap it in"""
+        if movies is None:
+            movies = self.read()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(self._line(movie) for movie in movies)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.line_count = len(movies)
+
+    def needs_compaction(self, movie_count):
+        """True once superseded records make up a third of the file"""
+        return self.line_count > movie_count * 1.5
+
+    def _line(self, movie):
+        return json.dumps(movie, ensure_ascii=False) + "\n"
+
+    def _migrate_legacy(self):
+        with open(self.legacy_path, "r", encoding="utf-8") as f:
+            movies = json.load(f)
+        logger.info(f"Migrating {len(movies)} movies from {self.legacy_path} to {self.path}")
+        self.compact(movies)
+        return movies
+
+def to_table(movies):
+    """Arrow table of catalog records"""
+    return pa.Table.from_pylist(movies, schema=CATALOG_SCHEMA)
+
+def export_columnar(movies, source_hash, path=COLUMNAR_FILE):
+    """
+    Write the catalog as Parquet, tagged with the hash of the JSON Lines
+    file it was exported from so readers can tell when it's stale
+    """
+    write_columnar(to_table(movies), source_hash, path)
+
+def write_columnar(table, source_hash, path=COLUMNAR_FILE):
+    """export_columnar for catalog records already in an Arrow table (see to_table)"""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    pq.write_table(table.replace_schema_metadata({"source_hash": source_hash}), tmp_path)
+    os.replace(tmp_path, path)
+    logger.info(f"Exported {table.num_rows} movies to {path}")
+
+def read_columnar(columns=None, source_hash=None, path=COLUMNAR_FILE):
+    """
+    Read only the given columns of the Parquet export, or return None if it
+    is missing or was exported from a different catalog than `source_hash`
+    """
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    if source_hash is not None and metadata.get(b"source_hash", b"").decode() != source_hash:
+        return None
+    return pq.read_table(path, columns=columns)
+
+def columnar_path_for(path):
+    """Where the Parquet export of a catalog file lives"""
+    if path == CATALOG_FILE:
+        return COLUMNAR_FILE
+    return os.path.splitext(path)[0] + ".parquet"
+
+def read_catalog_table(columns=None, path=CATALOG_FILE):
+    """
+    The catalog as an Arrow table restricted to `columns`. Reads the Parquet
+    export when it is up to date, otherwise parses the JSON Lines file and
+    refreshes the export for the next reader.
+    """
+    columnar_path = columnar_path_for(path)
+    movies = None
+    if not os.path.exists(path):
+        # Let CatalogLog migrate a legacy JSON catalog first
+        movies = read_catalog(path)
+    source_hash = catalog_hash(path)
+    table = read_columnar(columns, source_hash, columnar_path)
+    if table is not None:
+        return table, source_hash
+
+    with span("catalog_parse"):
+        if movies is None:
+            movies = read_catalog(path)
+        table = to_table(movies)
+    try:
+        with span("columnar_export"):
+            # The table just built, rather than converting the records again
+            write_columnar(table, source_hash, columnar_path)
+    except OSError as e:
+        logger.warning(f"Could not export {columnar_path}: {e}")
+    if columns is not None:
+        table = table.select(columns)
+    return table, source_hash
+
+def read_catalog(path=CATALOG_FILE):
+    """Load every movie from the catalog storage (or from a plain JSON array file)"""
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return CatalogLog(path).read()
@@ -0,0 +1,168 @@
+import bisect
+import re
+import unicodedata
+from collections.abc import Sequence
+
+import numpy as np
+
+# Relevance tiers, highest first. A tier always outranks any popularity bonus.
+TIER_EXACT = 3
+TIER_PREFIX = 2
+TIER_WORD_PREFIX = 1
+TIER_INFIX = 0
+
+_space_re = re.compile(r"\s+")
+
+def normalize_query(text):
+    """Casefold, strip accents and collapse whitespace"""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _space_re.sub(" ", text.casefold()).strip()
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class _PackedKeys(Sequence):
+    # Sorted keys as UTF-8 in one buffer instead of a str object each.
+    # UTF-8 bytes order like the strings they encode, so bisect works on them.
+    def __init__(self, keys):
+        encoded = [key.encode("utf-8") for key in keys]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(key) for key in encoded], out=self.offsets[1:])
+        self.data = b"".join(encoded)
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+class SuggestIndex:
+    """
+    Ranked autocomplete over catalog titles.
+    Uses a sorted title array for prefix matches, a sorted array of word
+    suffixes for matches at the start of any word (both packed as UTF-8),
+    and a trigram inverted index for infix matches. Results are ranked by match tier, then by
+    `vote_average`.
+    """
+
+    def __init__(self, titles, popularity):
+        # Shared with the catalog (MovieTable.titles), not copied
+        self.titles = titles
+        self.popularity = np.asarray(popularity, dtype=np.float32)
+        normalized = [normalize_query(title) for title in self.titles]
+
+        # Sorted (key, row) pairs for whole-title prefixes, and each row's
+        # position in them
+        order = sorted(range(len(normalized)), key=normalized.__getitem__)
+        self.prefix_keys = _PackedKeys(normalized[i] for i in order)
+        self.prefix_rows = np.asarray(order, dtype=np.int32)
+        self.prefix_position = np.empty(len(order), dtype=np.int32)
+        self.prefix_position[self.prefix_rows] = np.arange(len(order), dtype=np.int32)
+
+        # Sorted suffixes starting at every later word boundary
+        word_pairs = []
+        for row, title in enumerate(normalized):
+            for match in re.finditer(r" (?=\S)", title):
+                word_pairs.append((title[match.end():], row))
+        word_pairs.sort()
+        self.word_keys = _PackedKeys(key for key, _ in word_pairs)
+        self.word_rows = np.asarray([row for _, row in word_pairs], dtype=np.int32)
+
+        # Trigram -> sorted row ids
+        postings = {}
+        for row, title in enumerate(normalized):
+            for gram in trigrams(title):
+                postings.setdefault(gram, []).append(row)
+        self.postings = {gram: np.asarray(rows, dtype=np.int32) for gram, rows in postings.items()}
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        return cls(catalog.titles, catalog.vote_average)
+
+    def _prefix_range(self, keys, q):
+        # `q` UTF-8 encoded, like the keys
+        lo = bisect.bisect_left(keys, q)
+        hi = bisect.bisect_left(keys, q + "\U0010ffff".encode("utf-8"), lo)
+        return lo, hi
+
+    def _infix_rows(self, q):
+        grams = trigrams(q)
+        lists = []
+        for gram in grams:
+            rows = self.postings.get(gram)
+            if rows is None:
+                return np.empty(0, dtype=np.int32)
+            lists.append(rows)
+        lists.sort(key=len)
+        rows = lists[0]
+        for other in lists[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+            if not len(rows):
+                break
+        return rows
+
+    def _best(self, rows, k):
+        """Up to k rows ordered by popularity, highest first"""
+        if len(rows) > k:
+            part = np.argpartition(-self.popularity[rows], k - 1)[:k]
+            rows = rows[part]
+        return rows[np.argsort(-self.popularity[rows], kind="stable")]
+
+    def search(self, q, limit=10, allowed=None):
+        """
+        Return up to `limit` (row, tier) pairs for the query, best first,
+        only from the rows set in the boolean mask `allowed` if given
+        """
+        q = normalize_query(q)
+        if not q or limit <= 0:
+            return []
+
+        key = q.encode("utf-8")
+        results = []
+        seen = set()
+
+        def take(rows, tier, verify=False):
+            # Walk candidates in popularity order, widening the window only
+            # when verification rejects too many of them
+            if allowed is not None:
+                rows = rows[allowed[rows]]
+            k = limit + len(seen)
+            rejected = set()
+            while True:
+                for row in self._best(rows, k):
+                    row = int(row)
+                    if row in seen or row in rejected:
+                        continue
+                    # Byte substrings of UTF-8 keys are whole-character substrings
+                    if verify and key not in self.prefix_keys[self.prefix_position[row]]:
+                        rejected.add(row)
+                        continue
+                    seen.add(row)
+                    results.append((row, tier))
+                    if len(results) >= limit:
+                        return True
+                if k >= len(rows):
+                    return False
+                k *= 4
+
+        lo, hi = self._prefix_range(self.prefix_keys, key)
+        exact_hi = bisect.bisect_right(self.prefix_keys, key, lo, hi)
+        if take(self.prefix_rows[lo:exact_hi], TIER_EXACT):
+            return results
+        if take(self.prefix_rows[exact_hi:hi], TIER_PREFIX):
+            return results
+
+        lo, hi = self._prefix_range(self.word_keys, key)
+        if take(self.word_rows[lo:hi], TIER_WORD_PREFIX):
+            return results
+
+        if len(q) >= 3:
+            # A single trigram match is already exact; longer queries need
+            # checking since their trigrams may not be contiguous
+            take(self._infix_rows(q), TIER_INFIX, verify=len(q) > 3)
+        return results
+
+    def suggest(self, q, limit=10, allowed=None):
+        """Top `limit` titles for the query"""
+        return [self.titles[row] for row, _ in self.search(q, limit, allowed)]
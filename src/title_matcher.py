@@ -0,0 +1,109 @@
+import numpy as np
+from rapidfuzz import fuzz, process, utils
+
+from .suggest_index import normalize_query, trigrams
+
+# How many trigram-blocked candidates get a full fuzzy score
+MAX_CANDIDATES = 200
+
+# Below this score the blocked candidates are not trusted and every title is scored
+MIN_BLOCKED_SCORE = 60
+
+class TitleMatcher:
+    """
+    Resolves free-text titles to catalog rows.
+    Tries a normalized-exact hash lookup first (with exact titles only
+    where normalization would pick another row), then narrows
+    fuzzy candidates with a trigram blocking index before scoring them
+    with RapidFuzz.
+    """
+
+    def __init__(self, titles):
+        # Shared with the catalog (MovieTable.titles), not copied
+        self.titles = titles
+        # Normalized title -> first row, and exact title -> first row for
+        # the few titles whose normalized form resolves to an earlier,
+        # differently written one
+        self.normalized = {}
+        self.exact = {}
+        normalized_titles = []
+        for row, title in enumerate(self.titles):
+            key = normalize_query(title)
+            normalized_titles.append(key)
+            first = self.normalized.setdefault(key, row)
+            if first != row and title not in self.exact and self.titles[first] != title:
+                self.exact[title] = row
+        # RapidFuzz's default preprocessing, done once instead of per query.
+        # Applied to the normalized titles, so a query is resolved from its
+        # key alone; mostly a no-op, and then the key's string is reused.
+        self.processed = []
+        for key in normalized_titles:
+            processed = utils.default_process(key)
+            self.processed.append(key if processed == key else processed)
+
+        postings = {}
+        for row, key in enumerate(normalized_titles):
+            for gram in trigrams(key):
+                postings.setdefault(gram, []).append(row)
+        self.postings = {gram: np.asarray(rows, dtype=np.int32) for gram, rows in postings.items()}
+
+    def _candidates(self, key):
+        """Rows sharing the most trigrams with the query, in catalog order"""
+        lists = [self.postings[gram] for gram in trigrams(key) if gram in self.postings]
+        if not lists:
+            return np.empty(0, dtype=np.int32)
+        counts = np.bincount(np.concatenate(lists), minlength=len(self.titles))
+        hits = np.flatnonzero(counts)
+        if len(hits) > MAX_CANDIDATES:
+            part = np.argpartition(-counts[hits], MAX_CANDIDATES - 1)[:MAX_CANDIDATES]
+            hits = np.sort(hits[part])
+        return hits
+
+    def _best(self, key, rows, score_cutoff=0):
+        """(row, score) of the best fuzzy match for a normalized query among `rows`, earliest row on ties"""
+        choices = [self.processed[row] for row in rows]
+        scores = process.cdist(
+            [utils.default_process(key)], choices,
+            scorer=fuzz.WRatio, score_cutoff=score_cutoff, workers=-1,
+        )[0]
+        best = int(np.argmax(scores))
+        return int(rows[best]), float(scores[best])
+
+    def key(self, query):
+        """
+        Normalized form of `query`, e.g. for caching: queries with the same
+        key resolve to the same row. An exact title that its normalized
+        form would resolve to another row keeps a key of its own.
+        """
+        if query in self.exact:
+            return ("exact", query)
+        return normalize_query(query)
+
+    def match(self, query, min_score=0):
+        """
+        Return the row index of the closest title match, or None. A fuzzy
+        match must score at least `min_score` (RapidFuzz WRatio, 0-100).
+        """
+        if not self.titles:
+            return None
+        row = self.exact.get(query)
+        if row is not None:
+            return row
+        key = normalize_query(query)
+        row = self.normalized.get(key)
+        if row is not None:
+            return row
+
+        best_row, best_score = None, 0.0
+        candidates = self._candidates(key)
+        if len(candidates):
+            best_row, best_score = self._best(key, candidates)
+        if best_row is None or best_score < MIN_BLOCKED_SCORE:
+            # Nothing convincing in the blocked set; score every title, but
+            # let RapidFuzz skip anything worse than what we already have
+            row, score = self._best(key, np.arange(len(self.titles)), score_cutoff=best_score)
+            if best_row is None or score > best_score:
+                best_row, best_score = row, score
+        if best_score < min_score:
+            return None
+        return best_row
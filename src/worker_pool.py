@@ -0,0 +1,116 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .metrics import collect_spans, record_spans
+
+# Processes doing recommendation scoring; 0 runs it on a thread instead.
+# Each one loads its own catalog, model and caches, so the default stays
+# small enough for a free-tier instance; raise it where memory allows.
+RECOMMEND_WORKERS = int(os.getenv("RECOMMEND_WORKERS", str(min(os.cpu_count() or 1, 2))))
+
+# Requests allowed to wait for or run on the pool before new ones get a 503
+RECOMMEND_MAX_PENDING = int(os.getenv("RECOMMEND_MAX_PENDING", str(max(RECOMMEND_WORKERS, 1) * 4)))
+
+class Overloaded(Exception):
+    """Raised when a pool already has its maximum of pending requests"""
+
+def _ping():
+    # Long enough that one fast worker can't answer every ping of a round
+    time.sleep(0.05)
+    return os.getpid()
+
+def _traced(fn, *args):
+    # Runs in the worker; the spans travel back with the result
+    with collect_spans() as spans:
+        result = fn(*args)
+    return result, spans
+
+class WorkerPool:
+    """
+    Runs CPU-bound calls in a pool of worker processes, each of which loads
+    its own copy of the model through `initializer`, so heavy requests
+    never hold the event loop or FastAPI's threadpool. At most
+    `max_pending` calls may be queued or running; beyond that run() raises
+    Overloaded right away instead of letting latency grow without bound.
+    """
+
+    def __init__(self, workers=RECOMMEND_WORKERS, max_pending=RECOMMEND_MAX_PENDING, initializer=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.initializer = initializer
+        self.pending = 0
+        self.rejected = 0
+        self._executor = None
+
+    def start(self):
+        """Start the worker processes and wait until each has loaded the model"""
+        if self.workers <= 0 or self._executor is not None:
+            return
+        self._executor = self.prepare()
+
+    def prepare(self):
+        """
+        Start a new set of worker processes and wait until each has loaded
+        the model, without routing any calls to them yet (see swap)
+        """
+        if self.workers <= 0:
+            return None
+        # spawn, since forking a process that already runs threads isn't safe
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=self.initializer,
+        )
+        # Workers start lazily; ping until every one has loaded and answered
+        pids = set()
+        while len(pids) < self.workers:
+            futures = [executor.submit(_ping) for _ in range(self.workers)]
+            pids.update(future.result() for future in futures)
+        return executor
+
+    def swap(self, executor):
+        """
+        Send new calls to `executor` (from prepare) and return the previous
+        one for retire(). Call it on the event loop, so no run() is between
+        picking an executor and submitting to it.
+        """
+        previous, self._executor = self._executor, executor
+        return previous
+
+    @staticmethod
+    def retire(executor):
+        """Shut down a swapped-out executor once the calls already on it finish"""
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool, raising Overloaded if the queue is full"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded()
+        self.pending += 1
+        try:
+            if self._executor is None:
+                # The thread inherits the request context, so spans land directly
+                return await asyncio.to_thread(fn, *args)
+            result, spans = await asyncio.get_running_loop().run_in_executor(self._executor, _traced, fn, *args)
+            record_spans(spans)
+            return result
+        finally:
+            self.pending -= 1
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "rejected": self.rejected,
+        }
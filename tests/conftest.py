@@ -0,0 +1,101 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+PAGE_SIZE = 20
+
+class StubTMDb:
+    """
+    Minimal local TMDb: movie details (with credits), paged list endpoints
+    and /movie/changes, plus scripted error responses per path. Every
+    request is recorded as (monotonic time, path, query).
+    """
+
+    def __init__(self):
+        # id -> details response
+        self.movies = {}
+        # List endpoint path -> movie ids, served PAGE_SIZE per page
+        self.lists = {}
+        self.changes = []
+        # path -> [(status, headers)] returned (and consumed) before the real response
+        self.failures = {}
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def add_movie(self, movie_id, title, overview="", genres=(), actors=(), directors=(),
+                  release_date="2000-01-01", vote_average=6.0, poster_path=None):
+        self.movies[movie_id] = {
+            "id": movie_id,
+            "title": title,
+            "overview": overview,
+            "genres": [{"id": i, "name": name} for i, name in enumerate(genres)],
+            "credits": {
+                "cast": [{"name": name} for name in actors],
+                "crew": [{"name": name, "job": "Director"} for name in directors],
+            },
+            "release_date": release_date,
+            "poster_path": poster_path or f"/{movie_id}.jpg",
+            "vote_average": vote_average,
+        }
+
+    def fail(self, path, status, retry_after=None):
+        headers = {} if retry_after is None else {"Retry-After": str(retry_after)}
+        self.failures.setdefault(path, []).append((status, headers))
+
+    def paths(self, prefix=""):
+        return [path for _, path, _ in self.requests if path.startswith(prefix)]
+
+    def respond(self, path, query):
+        with self.lock:
+            self.requests.append((time.monotonic(), path, query))
+            failures = self.failures.get(path)
+            if failures:
+                return failures.pop(0) + (None,)
+        if path == "/movie/changes":
+            return 200, {}, {"results": [{"id": movie_id} for movie_id in self.changes], "page": 1, "total_pages": 1}
+        if path.startswith("/movie/") and path[len("/movie/"):].isdigit():
+            movie = self.movies.get(int(path[len("/movie/"):]))
+            if movie is None:
+                return 404, {}, {"status_message": "not found"}
+            return 200, {}, movie
+        ids = self.lists.get(path)
+        if ids is None:
+            return 200, {}, {"results": [], "page": 1, "total_pages": 0}
+        page = int(query.get("page", ["1"])[0])
+        chunk = ids[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+        results = [{"id": movie_id, "title": self.movies[movie_id]["title"]} for movie_id in chunk]
+        return 200, {}, {"results": results, "page": page, "total_pages": -(-len(ids) // PAGE_SIZE)}
+
+@pytest.fixture
+def tmdb_stub():
+    """(StubTMDb, base URL) of a stub TMDb served on a local port"""
+    stub = StubTMDb()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            status, headers, body = stub.respond(url.path, parse_qs(url.query))
+            payload = json.dumps(body if body is not None else {"status_code": status}).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    try:
+        yield stub, f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
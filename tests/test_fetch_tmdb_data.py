@@ -0,0 +1,80 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from src.fetch_tmdb_data import TMDbClient, main
+from src.storage import CatalogLog
+
+def _client(url, **kwargs):
+    kwargs.setdefault("rate", 1000)
+    return TMDbClient(api_key="test", base_url=url, **kwargs)
+
+def test_token_bucket_paces_requests_across_threads(tmdb_stub):
+    stub, url = tmdb_stub
+    stub.add_movie(1, "Alien")
+    client = _client(url, rate=20)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: client.get("/movie/1"), range(40)))
+    elapsed = time.monotonic() - start
+
+    # A burst of `rate` requests, then one every 1/rate seconds
+    assert elapsed >= 0.9
+    times = sorted(t for t, _, _ in stub.requests)
+    assert times[-1] - times[20] >= 19 / 20 * 0.9
+
+def test_retries_429_and_5xx_honouring_retry_after(tmdb_stub):
+    stub, url = tmdb_stub
+    stub.add_movie(1, "Alien")
+    stub.fail("/movie/1", 429, retry_after=0.3)
+    stub.fail("/movie/1", 503, retry_after=0.2)
+    client = _client(url, max_retries=3)
+
+    assert client.get("/movie/1")["title"] == "Alien"
+    times = [t for t, path, _ in stub.requests if path == "/movie/1"]
+    assert len(times) == 3
+    assert times[1] - times[0] >= 0.28
+    assert times[2] - times[1] >= 0.18
+
+def test_gives_up_after_max_retries(tmdb_stub):
+    stub, url = tmdb_stub
+    stub.add_movie(1, "Alien")
+    for _ in range(3):
+        stub.fail("/movie/1", 500, retry_after=0)
+    client = _client(url, max_retries=2)
+
+    with pytest.raises(requests.HTTPError):
+        client.get("/movie/1")
+    assert len(stub.paths("/movie/1")) == 3
+
+def test_resume_after_interruption_has_no_duplicate_ids(tmdb_stub, tmp_path, monkeypatch):
+    stub, url = tmdb_stub
+    for movie_id in range(1, 121):
+        stub.add_movie(movie_id, f"Movie {movie_id}", overview="space crew", genres=["Drama"])
+    stub.lists["/movie/popular"] = list(range(1, 121))
+    # main() keeps its sync state relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    storage = CatalogLog(str(tmp_path / "data" / "tmdb_movies.jsonl"))
+
+    # Interrupted on the third page of popular movies
+    client = _client(url)
+    get = client.get
+    def interrupted_get(path, **params):
+        if path == "/movie/popular" and params.get("page") == 3:
+            raise KeyboardInterrupt
+        return get(path, **params)
+    client.get = interrupted_get
+    with pytest.raises(KeyboardInterrupt):
+        main(client, target_count=100, storage=storage)
+    first = [movie["id"] for movie in storage.read()]
+    assert first == list(range(1, 41))
+
+    main(_client(url), target_count=60, storage=storage)
+    ids = [movie["id"] for movie in storage.read()]
+    assert ids == list(range(1, 61))
+    # Movies saved before the interruption were not fetched again
+    detail_paths = [path for path in stub.paths("/movie/") if path[len("/movie/"):].isdigit()]
+    assert len(detail_paths) == len(set(detail_paths)) == 60
@@ -0,0 +1,100 @@
+import shutil
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from bench.synthetic import SyntheticCatalog
+from src import recommend_enhanced
+from src.catalog import load_catalog
+from src.fetch_tmdb_data import TMDbClient, export_catalog, refresh
+from src.model_store import load_model
+from src.neighbors import build_neighbor_table, load_neighbor_table
+from src.storage import CatalogLog
+
+def _serve(stub, movie):
+    stub.add_movie(
+        movie["id"], movie["title"], movie["overview"], movie["genres"], movie["actors"], movie["directors"],
+        movie["release_date"], movie["vote_average"], poster_path="/" + movie["poster_url"].rsplit("/", 1)[1],
+    )
+
+# Three movies get another movie's overview
+EDITED = {5: 300, 17: 300, 200: 42}
+
+def _refresh(tmdb_stub, tmp_path, monkeypatch):
+    """Build a model over a synthetic catalog, then refresh EDITED from the stub"""
+    stub, url = tmdb_stub
+    # refresh() keeps its sync state relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    catalog_path = str(tmp_path / "data" / "tmdb_movies.jsonl")
+    model_dir = str(tmp_path / "data" / "model")
+
+    movies = SyntheticCatalog(400, seed=1).movies()
+    storage = CatalogLog(catalog_path)
+    storage.append(movies)
+    export_catalog(movies, storage)
+    recommend_enhanced.load_engine(catalog_path, model_dir, catalog=load_catalog(catalog_path))
+
+    for movie in movies:
+        _serve(stub, movie)
+    for movie_id, source_id in EDITED.items():
+        stub.movies[movie_id]["overview"] = movies[source_id - 1]["overview"]
+    # One more is reported but unchanged, and one isn't in our catalog at all
+    stub.changes = [5, 17, 200, 301, 9999]
+
+    client = TMDbClient(api_key="test", base_url=url, rate=1000)
+    updated = refresh(client, since=datetime.now(timezone.utc) - timedelta(days=3), storage=storage)
+    return movies, storage, updated, catalog_path, model_dir
+
+def test_refresh_supersedes_in_place_and_patches_only_affected_neighbors(tmdb_stub, tmp_path, monkeypatch):
+    stub, _ = tmdb_stub
+    movies, storage, updated, catalog_path, model_dir = _refresh(tmdb_stub, tmp_path, monkeypatch)
+    assert updated == [5, 17, 200]
+    assert "/movie/9999" not in stub.paths()
+
+    stored = storage.read()
+    # Superseding lines were appended, and each movie kept its position
+    assert storage.line_count == len(movies) + 3
+    assert [movie["id"] for movie in stored] == [movie["id"] for movie in movies]
+    for movie, refreshed in zip(movies, stored):
+        if movie["id"] in EDITED:
+            assert refreshed["overview"] == movies[EDITED[movie["id"]] - 1]["overview"]
+        else:
+            assert refreshed == movie
+
+    recomputed = []
+    def update_neighbor_table(*args, **kwargs):
+        result = update_neighbor_table_impl(*args, **kwargs)
+        recomputed.append(result[2])
+        return result
+    update_neighbor_table_impl = recommend_enhanced.update_neighbor_table
+    monkeypatch.setattr(recommend_enhanced, "update_neighbor_table", update_neighbor_table)
+    recommend_enhanced.update_model(updated, catalog_path, model_dir)
+
+    # Only the changed rows and the rows they could enter or leave were rescored
+    assert len(recomputed) == 1 and 3 <= recomputed[0] < len(movies) // 2
+
+    model = load_model(load_catalog(catalog_path).source_hash, model_dir)
+    assert model["manifest"]["patched_rows"] == 3
+    indices, scores = load_neighbor_table(model["path"])
+    full_path = str(tmp_path / "full")
+    shutil.copytree(model["path"], full_path)
+    full_indices, full_scores = build_neighbor_table(full_path)
+    np.testing.assert_allclose(scores, full_scores, rtol=1e-6)
+    # Movies with no overlap at all tie at 0 and may come in any order
+    matched = full_scores > 0
+    assert np.array_equal(np.asarray(indices)[matched], full_indices[matched])
+
+def test_refits_once_too_much_of_the_catalog_was_patched(tmdb_stub, tmp_path, monkeypatch):
+    _, _, updated, catalog_path, model_dir = _refresh(tmdb_stub, tmp_path, monkeypatch)
+    recommend_enhanced.update_model(updated, catalog_path, model_dir)
+    source_hash = load_catalog(catalog_path).source_hash
+    assert load_model(source_hash, model_dir)["manifest"]["patched_rows"] == 3
+
+    # The patched artifact matches the catalog, but has drifted too far to serve
+    monkeypatch.setattr(recommend_enhanced, "MODEL_PATCH_LIMIT", 0.005)
+    engine = recommend_enhanced.load_engine(catalog_path, model_dir, catalog=load_catalog(catalog_path))
+    model = load_model(source_hash, model_dir)
+    assert model["manifest"]["patched_rows"] == 0
+    assert load_neighbor_table(model["path"]) is not None
+    refit = recommend_enhanced.RecommenderEngine(load_catalog(catalog_path).movies)
+    assert (engine.tfidf_matrix != refit.tfidf_matrix).nnz == 0
@@ -0,0 +1,11 @@
+import numpy as np
+
+from src.scoring import top_k
+
+def test_top_k_breaks_ties_by_lowest_index():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        scores = rng.integers(0, 4, int(rng.integers(1, 80))).astype(np.float64)
+        k = int(rng.integers(0, len(scores) + 2))
+        expected = sorted(range(len(scores)), key=lambda i: (-scores[i], i))[:k]
+        assert top_k(scores, k).tolist() == expected
@@ -0,0 +1,15 @@
+from src.title_matcher import TitleMatcher
+
+TITLES = ["Alien", "Aliens", "Amélie", "The Dark Knight", "ALIEN", "Inception"]
+
+def test_spellings_of_a_query_share_a_key_and_a_match():
+    matcher = TitleMatcher(TITLES)
+    for spellings in (["Inception", "inception ", "INCEPTION"], ["Amelie", "amélie"], ["dark nite", "Dark  NITE"]):
+        assert len({matcher.key(query) for query in spellings}) == 1
+        assert len({matcher.match(query) for query in spellings}) == 1
+    assert TITLES[matcher.match("dark nite")] == "The Dark Knight"
+
+def test_exact_title_shadowed_by_its_normalized_form_keeps_its_own_key():
+    matcher = TitleMatcher(TITLES)
+    assert matcher.match("ALIEN") == 4 and matcher.match("alien") == 0
+    assert matcher.key("ALIEN") != matcher.key("alien")